@@ -0,0 +1,264 @@
+"""Асинхронные вьюхи для частых GET-запросов (режим ASGI).
+
+Каждая вьюха обслуживает только обычный GET через async ORM. Всё
+остальное (запись, браузерный API, курсорная пагинация, ошибки
+валидации и 404) передаётся обычной вьюхе DRF, поэтому ответы
+совпадают с синхронным режимом. Обработчик возвращает None, когда
+запрос нужно отдать синхронной вьюхе.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from recipes.autocomplete import ingredient_index
+from recipes.models import Ingredient, Tag
+from users.models import Follow
+
+from .authentication import token_user_cache
+from .cache import (
+    document_response,
+    make_document,
+    payload_cache,
+    payload_response,
+    recipe_documents,
+)
+from .filters import IngredientFilter, RecipeFilter
+from .paginations import CustomPagination, OptionalCursorPagination
+from .serializers import (
+    IngredientSerializer,
+    RecipeReadSerializer,
+    TagSerializer,
+    UserListSerializer,
+)
+from .views import IngredientViewSet, MeView, RecipeViewSet, TagViewSet
+
+
+async def aauthenticate(request):
+    """Пользователь по заголовку Authorization: Token <key>.
+
+    None означает, что заголовок не разобран или токен неверен:
+    такой запрос отдаётся синхронной вьюхе, чтобы вернуть её ошибку.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b"token":
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return None
+    user = await token_user_cache.aget(key)
+    if user is not None and user.is_active:
+        return user
+    token = (
+        await Token.objects.select_related("user").filter(key=key).afirst()
+    )
+    if token is None or not token.user.is_active:
+        return None
+    await token_user_cache.aset(key, token.user)
+    return token.user
+
+
+async def get_context(request, user):
+    """Контекст сериализатора с заранее загруженными подписками.
+
+    get_followed_author_ids берёт их из контекста и не обращается
+    к базе во время сериализации.
+    """
+    context = {"request": request, "format": None}
+    if user.is_authenticated:
+        context["followed_author_ids"] = frozenset(
+            [
+                author_id
+                async for author_id in Follow.objects.filter(
+                    user=user
+                ).values_list("author_id", flat=True)
+            ]
+        )
+    return context
+
+
+def json_response(data):
+    response = HttpResponse(
+        JSONRenderer().render(data), content_type="application/json"
+    )
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+def wants_browsable_api(request):
+    return "format" in request.GET or "text/html" in request.headers.get(
+        "Accept", ""
+    )
+
+
+def async_read_view(handler, sync_view):
+    """GET обслуживает корутина handler, остальное — sync_view."""
+    sync_view = sync_to_async(sync_view)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if request.method == "GET" and not wants_browsable_api(request):
+            user = await aauthenticate(request)
+            if user is not None:
+                request = Request(request)
+                request.user = user
+                response = await handler(request, *args, **kwargs)
+                if response is not None:
+                    return response
+                request = request._request
+        return await sync_view(request, *args, **kwargs)
+
+    return view
+
+
+async def recipe_list(request):
+    if request.query_params.get(
+        OptionalCursorPagination.mode_query_param
+    ) == OptionalCursorPagination.cursor_mode:
+        return None
+    view = RecipeViewSet(request=request, action="list", format_kwarg=None)
+    filterset = RecipeFilter(
+        request.query_params, queryset=view.get_queryset(), request=request
+    )
+    # Проверка фильтров читает теги и авторов из базы синхронно.
+    queryset = await sync_to_async(
+        lambda: filterset.qs if filterset.is_valid() else None
+    )()
+    if queryset is None:
+        return None
+    paginator = CustomPagination()
+    try:
+        recipes = await paginator.apaginate_queryset(queryset, request)
+    except NotFound:
+        return None
+    context = await get_context(request, request.user)
+    return json_response(
+        paginator.get_paginated_response(
+            RecipeReadSerializer(recipes, many=True, context=context).data
+        ).data
+    )
+
+
+async def recipe_detail(request, pk):
+    if request.query_params:
+        return None
+    view = RecipeViewSet(request=request, action="retrieve", format_kwarg=None)
+    if not settings.RECIPE_DOCUMENT_CACHE:
+        recipe = await view.get_queryset().filter(pk=pk).afirst()
+        if recipe is None:
+            return None
+        context = await get_context(request, request.user)
+        return json_response(
+            RecipeReadSerializer(recipe, context=context).data
+        )
+    flags = await view.get_document_lookup(pk).afirst()
+    if flags is None:
+        return None
+    key = recipe_documents.make_key(request, flags["id"], flags["version"])
+    document = await recipe_documents.aget(key)
+    if document is None:
+        recipe = await view.get_queryset().filter(pk=pk).afirst()
+        if recipe is None:
+            return None
+        document = await recipe_documents.aset(
+            key,
+            make_document(
+                RecipeReadSerializer(
+                    recipe, context=view.get_document_context()
+                ).data
+            ),
+        )
+    response = document_response(document, flags)
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+async def cached_list(request, model, serializer_class, queryset):
+    entry = payload_cache.get(model, "list")
+    if entry is None:
+        objects = [obj async for obj in queryset]
+        entry = payload_cache.set(
+            model,
+            "list",
+            JSONRenderer().render(
+                serializer_class(
+                    objects, many=True, context={"request": request}
+                ).data
+            ),
+        )
+    return payload_response(request._request, entry)
+
+
+async def ingredient_list(request):
+    params = set(request.query_params)
+    if not params:
+        return await cached_list(
+            request, Ingredient, IngredientSerializer, Ingredient.objects.all()
+        )
+    if params != {"name"}:
+        return None
+    name = request.query_params["name"]
+    if not name:
+        return None
+    limit = settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+    if settings.INGREDIENT_INDEX_IN_MEMORY:
+        return json_response(
+            await sync_to_async(ingredient_index.search)(
+                name, limit, contains=settings.INGREDIENT_AUTOCOMPLETE_CONTAINS
+            )
+        )
+    queryset = IngredientFilter(
+        request.query_params, queryset=Ingredient.objects.all()
+    ).qs[:limit]
+    return json_response(
+        IngredientSerializer(
+            [ingredient async for ingredient in queryset], many=True
+        ).data
+    )
+
+
+async def tag_list(request):
+    if request.query_params:
+        return None
+    return await cached_list(request, Tag, TagSerializer, Tag.objects.all())
+
+
+async def user_me(request):
+    if not request.user.is_authenticated:
+        return None
+    context = await get_context(request, request.user)
+    return json_response(
+        UserListSerializer(request.user, context=context).data
+    )
+
+
+recipe_list_view = async_read_view(
+    recipe_list, RecipeViewSet.as_view({"get": "list", "post": "create"})
+)
+recipe_detail_view = async_read_view(
+    recipe_detail,
+    RecipeViewSet.as_view(
+        {
+            "get": "retrieve",
+            "put": "update",
+            "patch": "partial_update",
+            "delete": "destroy",
+        }
+    ),
+)
+ingredient_list_view = async_read_view(
+    ingredient_list, IngredientViewSet.as_view({"get": "list"})
+)
+tag_list_view = async_read_view(tag_list, TagViewSet.as_view({"get": "list"}))
+user_me_view = async_read_view(user_me, MeView.as_view())
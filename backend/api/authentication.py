@@ -0,0 +1,116 @@
+"""Аутентификация по токену с кешем пользователей."""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenUserCache:
+    """Пользователи по sha256 токена.
+
+    Если задан общий кеш TOKEN_AUTH_SHARED_CACHE, пользователи хранятся
+    только в нём: выход и деактивация, сброшенные сигналами, сразу
+    видны всем процессам. Без него используется LRU в памяти процесса
+    на TOKEN_AUTH_CACHE_TTL секунд, и другие процессы увидят изменение
+    не позже чем через TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def shared_key(digest):
+        return f"auth_token:{digest}"
+
+    def _shared_cache(self):
+        alias = settings.TOKEN_AUTH_SHARED_CACHE
+        return caches[alias] if alias else None
+
+    def _get_local(self, digest):
+        entry = self._entries.get(digest)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+        # Копия: запросы не должны менять общий объект пользователя.
+        return copy.copy(entry[0])
+
+    def _set_local(self, digest, user):
+        with self._lock:
+            self._entries[digest] = (
+                copy.copy(user),
+                time.monotonic() + settings.TOKEN_AUTH_CACHE_TTL,
+            )
+            self._entries.move_to_end(digest)
+            while len(self._entries) > settings.TOKEN_AUTH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        digest = self.make_key(key)
+        shared = self._shared_cache()
+        if shared is not None:
+            return shared.get(self.shared_key(digest))
+        return self._get_local(digest)
+
+    async def aget(self, key):
+        digest = self.make_key(key)
+        shared = self._shared_cache()
+        if shared is not None:
+            return await shared.aget(self.shared_key(digest))
+        return self._get_local(digest)
+
+    def set(self, key, user):
+        digest = self.make_key(key)
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.set(
+                self.shared_key(digest), user, settings.TOKEN_AUTH_CACHE_TTL
+            )
+        else:
+            self._set_local(digest, user)
+
+    async def aset(self, key, user):
+        digest = self.make_key(key)
+        shared = self._shared_cache()
+        if shared is not None:
+            await shared.aset(
+                self.shared_key(digest), user, settings.TOKEN_AUTH_CACHE_TTL
+            )
+        else:
+            self._set_local(digest, user)
+
+    def invalidate(self, key):
+        digest = self.make_key(key)
+        with self._lock:
+            self._entries.pop(digest, None)
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.delete(self.shared_key(digest))
+
+
+token_user_cache = TokenUserCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для недавних токенов."""
+
+    def authenticate_credentials(self, key):
+        user = token_user_cache.get(key)
+        if user is not None and user.is_active:
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_user_cache.set(key, user)
+        return user, token
@@ -0,0 +1,228 @@
+"""Кеш готовых ответов: справочники и документы рецептов."""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+
+class PayloadCache:
+    """Сериализованные ответы в памяти процесса.
+
+    Записи группируются по модели и сбрасываются сигналами при её
+    изменении. Другие процессы узнают об изменении не позже чем через
+    REFERENCE_CACHE_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, model, key):
+        entry = self._entries.get((model, key))
+        if entry is None:
+            return None
+        if time.time() - entry["created"] >= settings.REFERENCE_CACHE_TTL:
+            return None
+        return entry
+
+    def set(self, model, key, body):
+        entry = {
+            "body": body,
+            "etag": f'"{hashlib.sha1(body).hexdigest()}"',
+            "created": time.time(),
+        }
+        with self._lock:
+            self._entries[(model, key)] = entry
+        return entry
+
+    def invalidate(self, model):
+        with self._lock:
+            for entry_key in [
+                entry_key for entry_key in self._entries
+                if entry_key[0] is model
+            ]:
+                del self._entries[entry_key]
+
+
+payload_cache = PayloadCache()
+
+
+def payload_response(request, entry):
+    """Ответ из записи PayloadCache: 200 с телом или 304.
+
+    request — обычный HttpRequest Django.
+    """
+    last_modified = int(entry["created"])
+    response = get_conditional_response(
+        request, etag=entry["etag"], last_modified=last_modified
+    )
+    if response is None:
+        response = HttpResponse(entry["body"], content_type="application/json")
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CachedPayloadMixin:
+    """list/retrieve без параметров отдаются из PayloadCache.
+
+    Ответ несёт ETag и Last-Modified, а условные запросы
+    (If-None-Match, If-Modified-Since) получают 304 без обращения
+    к базе.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(
+            request, "list", super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            request,
+            ("retrieve", str(kwargs.get(self.lookup_field))),
+            super().retrieve,
+            *args,
+            **kwargs,
+        )
+
+    def _cached_response(self, request, key, view, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != "json":
+            return view(request, *args, **kwargs)
+
+        model = self.queryset.model
+        entry = payload_cache.get(model, key)
+        if entry is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = payload_cache.set(
+                model, key, JSONRenderer().render(response.data)
+            )
+        return payload_response(request._request, entry)
+
+
+# Поля пользователя в документе рецепта; в кеше вместо них метки.
+DOCUMENT_FLAGS = ("is_favorited", "is_in_shopping_cart", "is_subscribed")
+
+
+def flag_marker(name):
+    return f'"{name}":"@{name}"'.encode()
+
+
+def make_document(data):
+    """JSON из RecipeReadSerializer с метками вместо флагов пользователя.
+
+    Кавычки внутри строк экранируются, поэтому метка не совпадёт
+    с текстом рецепта.
+    """
+    data = {
+        **data,
+        "is_favorited": "@is_favorited",
+        "is_in_shopping_cart": "@is_in_shopping_cart",
+        "author": {**data["author"], "is_subscribed": "@is_subscribed"},
+    }
+    return JSONRenderer().render(data)
+
+
+def render_document(document, flags):
+    """Подставить флаги пользователя: {поле: bool} для DOCUMENT_FLAGS."""
+    for name in DOCUMENT_FLAGS:
+        document = document.replace(
+            flag_marker(name),
+            f'"{name}":{"true" if flags[name] else "false"}'.encode(),
+        )
+    return document
+
+
+def document_response(document, flags):
+    return HttpResponse(
+        render_document(document, flags), content_type="application/json"
+    )
+
+
+class RecipeDocumentCache:
+    """Документы рецептов без данных пользователя.
+
+    Ключ — id и версия рецепта (Recipe.version) и адрес сайта, от
+    которого строятся ссылки на картинки. Любое изменение рецепта, его
+    тегов, ингредиентов или профиля автора меняет версию, и старый
+    документ больше не читается. Первый уровень — LRU в памяти процесса
+    на RECIPE_DOCUMENT_CACHE_SIZE записей, второй — общий кеш
+    RECIPE_DOCUMENT_SHARED_CACHE, если он задан.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(request, recipe_id, version):
+        return (
+            f"recipe_document:{recipe_id}:{version}:"
+            f"{request.build_absolute_uri('/')}"
+        )
+
+    def _shared_cache(self):
+        alias = settings.RECIPE_DOCUMENT_SHARED_CACHE
+        return caches[alias] if alias else None
+
+    def _get_local(self, key):
+        document = self._entries.get(key)
+        if document is not None:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+        return document
+
+    def _set_local(self, key, document):
+        with self._lock:
+            self._entries[key] = document
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.RECIPE_DOCUMENT_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        document = self._get_local(key)
+        shared = self._shared_cache()
+        if document is None and shared is not None:
+            document = shared.get(key)
+            if document is not None:
+                self._set_local(key, document)
+        return document
+
+    async def aget(self, key):
+        document = self._get_local(key)
+        shared = self._shared_cache()
+        if document is None and shared is not None:
+            document = await shared.aget(key)
+            if document is not None:
+                self._set_local(key, document)
+        return document
+
+    def set(self, key, document):
+        self._set_local(key, document)
+        shared = self._shared_cache()
+        if shared is not None:
+            shared.set(key, document, settings.RECIPE_DOCUMENT_CACHE_TTL)
+        return document
+
+    async def aset(self, key, document):
+        self._set_local(key, document)
+        shared = self._shared_cache()
+        if shared is not None:
+            await shared.aset(
+                key, document, settings.RECIPE_DOCUMENT_CACHE_TTL
+            )
+        return document
+
+
+recipe_documents = RecipeDocumentCache()
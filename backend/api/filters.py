@@ -1,7 +1,50 @@
 import django_filters
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+from django.db.models.functions import Lower
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
+
+
+TAG_IDS_CACHE_KEY = "tag_ids_by_slug"
+
+
+def get_tag_ids_by_slug(slugs=()):
+    """Словарь {slug: id} всех тегов, кешируется до изменения тегов.
+
+    Сигнал сбрасывает кеш только в своём процессе, поэтому, если
+    какого-то из slugs нет в кеше (тег создан в другом процессе),
+    теги перечитываются из базы.
+    """
+    tag_ids = cache.get(TAG_IDS_CACHE_KEY)
+    if tag_ids is None or not tag_ids.keys() >= set(slugs):
+        tag_ids = dict(Tag.objects.values_list("slug", "id"))
+        cache.set(TAG_IDS_CACHE_KEY, tag_ids, settings.REFERENCE_CACHE_TTL)
+    return tag_ids
+
+
+class TagSlugsField(forms.MultipleChoiceField):
+    """Slug тегов; после проверки — список id этих тегов."""
+
+    def valid_value(self, value):
+        return value in self.tag_ids
+
+    def clean(self, value):
+        value = self.to_python(value)
+        if not value:
+            return super().clean(value)
+        self.tag_ids = get_tag_ids_by_slug(value)
+        self.validate(value)
+        self.run_validators(value)
+        return [self.tag_ids[slug] for slug in value]
+
+
+class TagSlugsFilter(filters.MultipleChoiceFilter):
+    field_class = TagSlugsField
 
 
 class RecipeFilter(filters.FilterSet):
@@ -11,11 +54,38 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
     )
-    tags = filters.AllValuesMultipleFilter(field_name="tags__slug")
+    tags = TagSlugsFilter(
+        method="filter_tags",
+        choices=lambda: [(slug, slug) for slug in get_tag_ids_by_slug()],
+    )
+    search = filters.CharFilter(method="filter_search")
 
     class Meta:
         model = Recipe
-        fields = ("author", "tags", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "author",
+            "tags",
+            "is_favorited",
+            "is_in_shopping_cart",
+            "search",
+        )
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов, полусоединением без DISTINCT.
+
+        value — id тегов, найденные TagSlugsField при проверке.
+        """
+        return queryset.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef("pk"), tag_id__in=value
+                )
+            )
+        )
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, ингредиентам и описанию."""
+        return search_recipes(queryset, value)
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -33,10 +103,32 @@ class RecipeFilter(filters.FilterSet):
 class IngredientFilter(django_filters.FilterSet):
     """Фильтр для ингредиентов."""
 
-    name = django_filters.CharFilter(
-        field_name="name", lookup_expr="istartswith"
-    )
+    name = django_filters.CharFilter(method="filter_name")
 
     class Meta:
         model = Ingredient
         fields = ["name"]
+
+    def filter_name(self, queryset, name, value):
+        """Сначала совпадения по началу названия, затем по подстроке.
+
+        Поиск идёт по lower(name): для начала названия есть индекс
+        с varchar_pattern_ops, для подстроки — триграммный GIN-индекс.
+        """
+        value = value.lower()
+        queryset = queryset.annotate(lower_name=Lower("name"))
+        if not settings.INGREDIENT_AUTOCOMPLETE_CONTAINS:
+            return queryset.filter(lower_name__startswith=value).order_by(
+                "lower_name"
+            )
+        return (
+            queryset.filter(lower_name__contains=value)
+            .annotate(
+                rank=Case(
+                    When(lower_name__startswith=value, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by("rank", "lower_name")
+        )
@@ -0,0 +1,112 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.http import QueryDict
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.filters import RecipeFilter
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Recipe, ShoppingBasket, Tag
+
+User = get_user_model()
+
+HOT_TABLES = {
+    Recipe._meta.db_table,
+    Recipe.tags.through._meta.db_table,
+    Favorite._meta.db_table,
+    ShoppingBasket._meta.db_table,
+}
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN ANALYZE for the canonical RecipeFilter combinations "
+        "on the busiest author, tags and users and fail if the planner "
+        "chooses a sequential scan for any of them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-seqscan",
+            action="store_true",
+            help="Disable sequential scans to check only that a usable "
+            "index exists for every query. By default the planner keeps "
+            "its settings, so run the check on a seeded, analyzed database",
+        )
+
+    @staticmethod
+    def most_frequent(queryset, field, count=1):
+        """Самые частые значения field, при равенстве — меньшие."""
+        return list(
+            queryset.values_list(field, flat=True)
+            .annotate(rows=Count("pk"))
+            .order_by("-rows", field)[:count]
+        )
+
+    def get_cases(self):
+        authors = self.most_frequent(Recipe.objects, "author")
+        favorite_users = self.most_frequent(Favorite.objects, "user")
+        basket_users = self.most_frequent(ShoppingBasket.objects, "user")
+        tag_ids = self.most_frequent(Recipe.tags.through.objects, "tag", 2)
+        if not (authors and favorite_users and basket_users and tag_ids):
+            raise CommandError(
+                "Seed recipes, tags, favorites and shopping baskets first"
+            )
+        favorite_user = User.objects.get(pk=favorite_users[0])
+        basket_user = User.objects.get(pk=basket_users[0])
+        author = f"author={authors[0]}"
+        tags = "&".join(
+            f"tags={slug}"
+            for slug in Tag.objects.filter(pk__in=tag_ids)
+            .order_by("slug")
+            .values_list("slug", flat=True)
+        )
+        return [
+            ("feed", "", None),
+            ("author", author, None),
+            ("tags", tags, None),
+            ("author+tags", f"{author}&{tags}", None),
+            ("is_favorited", "is_favorited=1", favorite_user),
+            ("is_in_shopping_cart", "is_in_shopping_cart=1", basket_user),
+            ("is_favorited+tags", f"is_favorited=1&{tags}", favorite_user),
+        ]
+
+    def get_queryset(self, query, user):
+        request = Request(RequestFactory().get(f"/api/recipes/?{query}"))
+        request.user = user or AnonymousUser()
+        view = RecipeViewSet(request=request, action="list", format_kwarg=None)
+        return RecipeFilter(
+            QueryDict(query), queryset=view.get_queryset(), request=request
+        ).qs[: settings.PAGE_SIZE]
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            if options["no_seqscan"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, query, user in self.get_cases():
+                plan = self.get_queryset(query, user).explain(analyze=True)
+                scanned = HOT_TABLES.intersection(SEQ_SCAN.findall(plan))
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"--- {name}: ?{query}\n{plan}")
+                if scanned:
+                    failures.append(name)
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f"{name}: seq scan on {', '.join(sorted(scanned))}"
+                        )
+                    )
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"{name}: OK"))
+        if failures:
+            raise CommandError(
+                f"Sequential scans in: {', '.join(failures)}"
+            )
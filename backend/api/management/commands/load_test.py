@@ -0,0 +1,228 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe, Tag
+
+User = get_user_model()
+
+# {tag}, {author} и {recipe} подставляются из базы перед запуском.
+DEFAULT_PATHS = (
+    "/api/recipes/",
+    "/api/recipes/?limit=20",
+    "/api/recipes/?pagination=cursor",
+    "/api/recipes/?tags={tag}",
+    "/api/recipes/?author={author}",
+    "/api/recipes/?is_favorited=1",
+    "/api/recipes/?is_in_shopping_cart=1",
+    "/api/recipes/?search=суп",
+    "/api/recipes/{recipe}/",
+    "/api/recipes/feed/",
+    "/api/recipes/download_shopping_cart/",
+    "/api/users/subscriptions/",
+    "/api/users/me/",
+    "/api/tags/",
+    "/api/ingredients/?name=со",
+)
+METRICS = ("rps", "p50", "p95", "p99")
+
+
+def change(value, base):
+    """Изменение относительно базового замера в процентах."""
+    return f"{(value / base - 1) * 100:+.0f}%" if base else "-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent GET requests to a running server or through the "
+        "Django test client, report throughput and latency percentiles "
+        "per path and compare them with a saved baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url", default="http://localhost:8000", help="Server URL"
+        )
+        parser.add_argument(
+            "--client",
+            action="store_true",
+            help="Call the application in-process through the Django test "
+            "client instead of HTTP",
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to request, may be repeated",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=16, help="Parallel clients"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Requests per path"
+        )
+        parser.add_argument("--token", help="Auth token for the requests")
+        parser.add_argument(
+            "--user",
+            help="Email of the user to authenticate as, by default the "
+            "user with most follows",
+        )
+        parser.add_argument("--save", help="Write results to a JSON file")
+        parser.add_argument(
+            "--baseline", help="JSON file from --save to compare with"
+        )
+
+    def get_token(self, options):
+        if options["token"]:
+            return options["token"]
+        users = User.objects.filter(is_active=True)
+        if options["user"]:
+            user = users.filter(email=options["user"]).first()
+        else:
+            user = (
+                users.annotate(follows=Count("follower"))
+                .order_by("-follows", "id")
+                .first()
+            )
+        if user is None:
+            raise CommandError("No user to authenticate as")
+        return Token.objects.get_or_create(user=user)[0].key
+
+    def format_paths(self, paths):
+        """Подставить в пути существующие тег, автора и рецепт."""
+        recipe = Recipe.objects.order_by("-favorites_count").first()
+        tag = Tag.objects.order_by("id").first()
+        author = (
+            User.objects.order_by("-recipes_count").values_list(
+                "id", flat=True
+            )
+        ).first()
+        if recipe is None or tag is None:
+            raise CommandError("No recipes or tags, run seed_data first")
+        return [
+            path.format(tag=tag.slug, author=author, recipe=recipe.pk)
+            for path in paths
+        ]
+
+    def http_request(self, url, headers):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(
+                urllib.request.Request(url, headers=headers), timeout=30
+            ) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+    def client_request(self, path, headers):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            host = settings.ALLOWED_HOSTS[0].lstrip(".")
+            client = self.local.client = Client(
+                headers=headers,
+                SERVER_NAME="localhost" if host == "*" else host,
+            )
+        started = time.perf_counter()
+        response = client.get(path)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        else:
+            response.content
+        return time.perf_counter() - started, response.status_code == 200
+
+    def run_path(self, request, concurrency, total):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(lambda _: request(), range(total)))
+            elapsed = time.perf_counter() - started
+        latencies = sorted(latency for latency, _ in results)
+        percentiles = statistics.quantiles(latencies, n=100)
+        return {
+            "rps": total / elapsed,
+            "p50": percentiles[49] * 1000,
+            "p95": percentiles[94] * 1000,
+            "p99": percentiles[98] * 1000,
+            "errors": sum(not ok for _, ok in results),
+        }
+
+    def handle(self, *args, **options):
+        self.local = threading.local()
+        self.in_process = options["client"]
+        headers = {
+            "Accept": "application/json",
+            "Authorization": f"Token {self.get_token(options)}",
+        }
+        baseline = {}
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())[
+                "results"
+            ]
+        paths = options["paths"] or self.format_paths(DEFAULT_PATHS)
+
+        header = (
+            f"{'path':<40}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'errors':>8}"
+        )
+        if baseline:
+            header += "".join(f"{'Δ' + name:>9}" for name in METRICS)
+        self.stdout.write(header)
+        results = {}
+        for path in paths:
+            if self.in_process:
+                request = partial(self.client_request, path, headers)
+            else:
+                url = options["base_url"].rstrip("/") + quote(
+                    path, safe="/?=&"
+                )
+                request = partial(self.http_request, url, headers)
+            result = results[path] = self.run_path(
+                request, options["concurrency"], options["requests"]
+            )
+            line = (
+                f"{path:<40}{result['rps']:>9.1f}{result['p50']:>9.1f}"
+                f"{result['p95']:>9.1f}{result['p99']:>9.1f}"
+                f"{result['errors']:>8}"
+            )
+            if path in baseline:
+                line += "".join(
+                    f"{change(result[name], baseline[path][name]):>9}"
+                    for name in METRICS
+                )
+            self.stdout.write(line)
+
+        if options["save"]:
+            Path(options["save"]).write_text(
+                json.dumps(
+                    {
+                        "created": datetime.now(timezone.utc).isoformat(),
+                        "target": (
+                            "client"
+                            if self.in_process
+                            else options["base_url"]
+                        ),
+                        "concurrency": options["concurrency"],
+                        "requests": options["requests"],
+                        "results": results,
+                    },
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            )
+            self.stdout.write(f"Saved results to {options['save']}")
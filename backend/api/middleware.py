@@ -0,0 +1,149 @@
+"""Учёт SQL-запросов каждого запроса к API.
+
+QueryBudgetMiddleware считает запросы к базе, их суммарное время и
+повторяющиеся запросы, отдаёт заголовок Server-Timing, пишет строку
+JSON в лог api.queries и сверяет число запросов с бюджетом эндпоинта
+из QUERY_BUDGETS. Без QUERY_BUDGET_ENABLED middleware отключается
+при запуске и ничего не стоит.
+"""
+
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger("api.queries")
+
+current_stats = ContextVar("query_stats", default=None)
+
+# IN (%s, %s, ...) с разной длиной списка — один и тот же запрос.
+PLACEHOLDER_LIST = re.compile(r"\(%s(?:, %s)*\)")
+
+
+class QueryBudgetExceeded(Exception):
+    """Запрос к API выполнил больше SQL-запросов, чем разрешено."""
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def duplicates(self):
+        return [
+            {"sql": sql, "count": count}
+            for sql, count in self.fingerprints.most_common(
+                settings.QUERY_BUDGET_DUPLICATES
+            )
+            if count > 1
+        ]
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: учитывает запрос, если идёт замер."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started
+        stats.fingerprints[PLACEHOLDER_LIST.sub("(%s...)", sql)] += 1
+
+
+def install_wrapper(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryBudgetMiddleware:
+    """Замер запросов к базе для синхронных и асинхронных вьюх.
+
+    Обёртка ставится на каждое соединение, а статистика запроса лежит
+    в ContextVar: так учитываются и запросы async ORM, которые
+    выполняются в потоках sync_to_async. Запросы потоковых ответов
+    (выгрузка списка покупок) выполняются после middleware и не
+    учитываются.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install_wrapper)
+        for connection in connections.all(initialized_only=True):
+            install_wrapper(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.process(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.process(request, response, stats, started)
+
+    def process(self, request, response, stats, started):
+        elapsed = time.perf_counter() - started
+        response["Server-Timing"] = (
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} '
+            f'queries", app;dur={elapsed * 1000:.1f}'
+        )
+        match = request.resolver_match
+        endpoint = match.view_name if match else None
+        # QUERY_BUDGETS — бюджеты чтения; запись (создание рецепта с
+        # ингредиентами и тегами) проверяется по QUERY_BUDGET_DEFAULT.
+        budget = settings.QUERY_BUDGET_DEFAULT
+        if request.method in ("GET", "HEAD"):
+            budget = settings.QUERY_BUDGETS.get(endpoint, budget)
+        over_budget = budget is not None and stats.count > budget
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "queries": stats.count,
+            "db_ms": round(stats.duration * 1000, 1),
+            "total_ms": round(elapsed * 1000, 1),
+            "budget": budget,
+            "duplicates": stats.duplicates(),
+        }
+        if over_budget:
+            logger.warning(json.dumps(record, ensure_ascii=False))
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(
+                    f"{endpoint}: {stats.count} запросов при бюджете "
+                    f"{budget}"
+                )
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
@@ -1,8 +1,165 @@
+import base64
+import binascii
+import json
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = settings.PAGE_SIZE
     page_size_query_param = "limit"
     max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset для асинхронных вьюх (async ORM)."""
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request)
+        )
+        paginator.count = await queryset.acount()
+        try:
+            self.page = paginator.page(
+                self.get_page_number(request, paginator)
+            )
+        except InvalidPage as exc:
+            raise NotFound(str(exc))
+        self.page.object_list = [
+            obj async for obj in self.page.object_list
+        ]
+        self.request = request
+        return self.page.object_list
+
+
+class CustomCursorPagination(CursorPagination):
+    """Курсорная пагинация по всем полям ordering: без OFFSET и COUNT(*).
+
+    Позиция — значения полей порядка у крайней строки страницы, например
+    (pub_date, id), как в ленте подписок: строки с одинаковой датой не
+    пропускаются и не повторяются. Последнее поле должно быть
+    уникальным.
+    """
+
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = 100
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.after(ordering, position))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    @staticmethod
+    def after(ordering, position):
+        """Строки, идущие в порядке ordering после position."""
+        condition, equal = Q(), Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(True, self.page[0])
+
+    def encode_cursor(self, reverse, row):
+        position = []
+        for field in self.ordering:
+            value = getattr(row, field.lstrip("-"))
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            position.append(value)
+        cursor = base64.urlsafe_b64encode(
+            json.dumps([int(reverse), position]).encode()
+        ).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        """(назад ли, позиция) из ?cursor=; без курсора — (False, None)."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return False, None
+        try:
+            reverse, position = json.loads(
+                base64.urlsafe_b64decode(cursor.encode())
+            )
+        except (binascii.Error, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), position
+
+
+class OptionalCursorPagination(CustomPagination):
+    """Постраничная пагинация, курсорная — по ?pagination=cursor.
+
+    Порядок для курсора берётся из атрибута cursor_ordering вьюхи,
+    например ("-pub_date", "-id"). Если он None (поиск упорядочен по
+    релевантности), курсорный режим отклоняется.
+    """
+
+    mode_query_param = "pagination"
+    cursor_mode = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if request.query_params.get(self.mode_query_param) == self.cursor_mode:
+            if view.cursor_ordering is None:
+                raise ValidationError(
+                    {
+                        self.mode_query_param: (
+                            "Курсорная пагинация недоступна для этого "
+                            "запроса."
+                        )
+                    }
+                )
+            self.cursor_paginator = CustomCursorPagination()
+            self.cursor_paginator.ordering = view.cursor_ordering
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
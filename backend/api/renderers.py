@@ -0,0 +1,106 @@
+"""Форматы выгрузки списка покупок."""
+
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    """Псевдо-файл: csv.writer пишет в него, а строка сразу отдаётся."""
+
+    def write(self, value):
+        return value
+
+
+async def stream_async(parts, size):
+    """Асинхронный итератор по синхронному генератору parts.
+
+    ASGI-обработчик Django собирает синхронный итератор потокового
+    ответа в список целиком. Здесь части читаются пачками по size в
+    потоке запроса (там же, где открыт курсор базы), и в памяти
+    держится только одна пачка.
+    """
+    parts = iter(parts)
+    take = sync_to_async(lambda: list(islice(parts, size)))
+    while batch := await take():
+        yield "".join(batch)
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Выбирается через ?format= или заголовок Accept, а содержимое
+    отдаётся по частям генератором stream() для StreamingHttpResponse.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Обычные ответы DRF (ошибки доступа и т.п.) отдаются как JSON."""
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, ingredients):
+        raise NotImplementedError
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+    def stream(self, ingredients):
+        yield "Список покупок:\n\n"
+        total = 0
+        for item in ingredients:
+            total += 1
+            yield (
+                f"- {item['name']} - {item['total_amount']} "
+                f"{item['measurement_unit']}\n"
+            )
+        yield f"\nВсего ингредиентов: {total}"
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(("Ингредиент", "Количество", "Единица"))
+        for item in ingredients:
+            yield writer.writerow(
+                (
+                    item["name"],
+                    item["total_amount"],
+                    item["measurement_unit"],
+                )
+            )
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = "application/json"
+    format = "json"
+
+    def stream(self, ingredients):
+        yield "["
+        separator = ""
+        for item in ingredients:
+            yield separator + json.dumps(
+                {
+                    "name": item["name"],
+                    "amount": item["total_amount"],
+                    "measurement_unit": item["measurement_unit"],
+                },
+                ensure_ascii=False,
+            )
+            separator = ","
+        yield "]"
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+)
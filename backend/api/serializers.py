@@ -1,27 +1,86 @@
 import base64
+import json
+import os
 import re
+from tempfile import SpooledTemporaryFile
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
+from rest_framework.utils import html
 
+from recipes.images import VARIANT_FORMATS, enqueue_image
 from recipes.models import (
     Favorite,
     Ingredient,
     IngredientsInRecipe,
     Recipe,
     ShoppingBasket,
+    ShoppingListItem,
     Tag,
 )
+from recipes.search import update_search_vectors
 from users.models import Follow
 
 User = get_user_model()
 
+BASE64_MARKER = ";base64,"
+
 
 """Сериализаторы для пользователей."""
 
 
+def get_followed_author_ids(context):
+    """Id авторов, на которых подписан пользователь запроса.
+
+    Загружаются одним запросом и кешируются в контексте, который
+    разделяют все вложенные сериализаторы одного ответа.
+    """
+    request = context.get("request")
+    if not request or not request.user.is_authenticated:
+        return frozenset()
+    if "followed_author_ids" not in context:
+        context["followed_author_ids"] = frozenset(
+            Follow.objects.filter(user=request.user).values_list(
+                "author_id", flat=True
+            )
+        )
+    return context["followed_author_ids"]
+
+
+def build_srcset(variants, request):
+    """Значения srcset для <picture>: {"webp": "url 200w, ...", ...}.
+
+    Пока копии не готовы, возвращается None и клиент показывает
+    исходную картинку.
+    """
+    if not variants:
+        return None
+    variants = sorted(variants.values(), key=lambda variant: variant["width"])
+    srcset = {}
+    for extension, _ in VARIANT_FORMATS:
+        urls = []
+        for variant in variants:
+            url = default_storage.url(variant[extension])
+            if request:
+                url = request.build_absolute_uri(url)
+            urls.append(f"{url} {variant['width']}w")
+        srcset[extension] = ", ".join(urls)
+    return srcset
+
+
+class SrcsetField(serializers.ReadOnlyField):
+    """srcset копий изображения из поля {field}_variants."""
+
+    def to_representation(self, value):
+        return build_srcset(value, self.context.get("request"))
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для модели пользователя."""
 
@@ -43,12 +102,7 @@ class UserSerializer(serializers.ModelSerializer):
         username = serializers.CharField(max_length=150)
 
     def get_is_subscribed(self, obj):
-        request_user = self.context["request"].user
-        if request_user.is_authenticated:
-            if obj == request_user:
-                return False
-            return obj.followers.filter(user=request_user).exists()
-        return False
+        return obj.id in get_followed_author_ids(self.context)
 
     def get_avatar(self, obj):
         if obj.avatar:
@@ -115,6 +169,7 @@ class UserListSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
+    avatar_srcset = SrcsetField(source="avatar_variants")
 
     class Meta:
         model = User
@@ -126,18 +181,11 @@ class UserListSerializer(serializers.ModelSerializer):
             "last_name",
             "is_subscribed",
             "avatar",
+            "avatar_srcset",
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            if obj == request.user:
-                return False
-            return Follow.objects.filter(
-                user=request.user,
-                author=obj
-            ).exists()
-        return False
+        return obj.id in get_followed_author_ids(self.context)
 
     def get_avatar(self, obj):
         """Вернём ссылку на аватар, если он есть."""
@@ -152,9 +200,11 @@ class UserListSerializer(serializers.ModelSerializer):
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Вспомогательный сериализатор пецептов"""
 
+    image_srcset = SrcsetField(source="image_variants")
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_srcset", "cooking_time")
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -193,6 +243,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_srcset = SrcsetField(source="image_variants")
 
     class Meta:
         model = Recipe
@@ -205,12 +256,16 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_srcset",
+            "image_status",
             "text",
             "cooking_time",
         )
 
     def get_is_favorited(self, obj):
         """Проверка избранного"""
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return Favorite.objects.filter(
@@ -220,6 +275,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Проверка наличия рецепта в корзине"""
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         request = self.context.get("request")
         if request and request.user.is_authenticated:
             return ShoppingBasket.objects.filter(
@@ -228,28 +285,70 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return False
 
 
+def decode_base64_image(data):
+    """Декодировать data URL по частям во временный файл.
+
+    Декодированная картинка целиком в памяти не держится: до
+    FILE_UPLOAD_MAX_MEMORY_SIZE байт она лежит в памяти, дальше
+    SpooledTemporaryFile переносит её на диск.
+    """
+    start = data.index(BASE64_MARKER)
+    ext = data[:start].split("/")[-1]
+    file = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+        dir=settings.FILE_UPLOAD_TEMP_DIR,
+    )
+    chunk_size = settings.IMAGE_DECODE_CHUNK_SIZE
+    for position in range(start + len(BASE64_MARKER), len(data), chunk_size):
+        file.write(
+            base64.b64decode(
+                data[position:position + chunk_size], validate=True
+            )
+        )
+    file.seek(0)
+    return File(file, name=f"recipe_image.{ext}")
+
+
 class Base64ImageField(serializers.ImageField):
-    """Конвертация картинки для сериализатора рецептов"""
+    """Картинка в виде data URL или файла из multipart-формы.
+
+    При IMAGE_PROCESSING_ASYNC картинка не открывается Pillow в запросе:
+    её проверяет и обрабатывает фоновая команда process_images.
+    """
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
             try:
-                format, imgstr = data.split(";base64,")
-                ext = format.split("/")[-1]
-                decoded_file = base64.b64decode(imgstr)
-                file_name = f"recipe_image.{ext}"
-                data = ContentFile(decoded_file, name=file_name)
-
+                data = decode_base64_image(data)
             except Exception:
                 raise serializers.ValidationError(
                     "Некорректный формат изображения"
                 )
+        if settings.IMAGE_PROCESSING_ASYNC:
+            ext = os.path.splitext(getattr(data, "name", None) or "")[1]
+            if ext[1:].lower() not in settings.IMAGE_EXTENSIONS:
+                raise serializers.ValidationError(
+                    "Некорректный формат изображения"
+                )
+            return serializers.FileField.to_internal_value(self, data)
 
         return super().to_internal_value(data)
 
 
+class JSONListField(serializers.ListField):
+    """Список; в multipart-форме передаётся JSON-строкой."""
+
+    def get_value(self, dictionary):
+        if html.is_html_input(dictionary) and self.field_name in dictionary:
+            try:
+                return json.loads(dictionary[self.field_name])
+            except ValueError:
+                return dictionary[self.field_name]
+        return super().get_value(dictionary)
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    ingredients = serializers.ListField(
+    ingredients = JSONListField(
         child=serializers.DictField(), write_only=True
     )
     tags = serializers.PrimaryKeyRelatedField(
@@ -312,7 +411,10 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return value
 
     def validate(self, data):
-        """Валидация тегов."""
+        """Валидация тегов и обязательных при обновлении полей.
+
+        Вся проверка заканчивается до транзакции записи рецепта.
+        """
         tags = data.get("tags")
         if not tags:
             raise serializers.ValidationError(
@@ -322,56 +424,134 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {"tags": "Теги не должны повторяться."}
             )
+        if "ingredients" not in data:
+            raise serializers.ValidationError(
+                {"ingredients": "Поле обязательно при обновлении рецепта."}
+            )
         return data
 
-    def _create_ingredients(self, recipe, ingredients_data):
-        """Создание ингредиентов для рецепта (вспомогательный метод)."""
-        ingredients_to_create = [
+    def _set_ingredients(self, recipe, ingredients_data, created=False):
+        """Привести ингредиенты рецепта к ingredients_data.
+
+        Существующие строки сравниваются с новыми: изменённые количества
+        обновляются одним bulk_update, новые строки вставляются, лишние
+        удаляются. Возвращает True, если изменился набор ингредиентов.
+        """
+        new_amounts = {
+            int(ingredient["id"]): int(ingredient["amount"])
+            for ingredient in ingredients_data
+        }
+        rows = (
+            {}
+            if created
+            else {
+                row.ingredient_id: row
+                for row in IngredientsInRecipe.objects.filter(recipe=recipe)
+            }
+        )
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
+        to_update = []
+        for ingredient_id, row in rows.items():
+            amount = new_amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                to_update.append(row)
+        to_delete = [
+            row.pk
+            for ingredient_id, row in rows.items()
+            if ingredient_id not in new_amounts
+        ]
+        to_create = [
             IngredientsInRecipe(
-                recipe=recipe,
-                ingredient_id=ingredient["id"],
-                amount=ingredient["amount"],
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
             )
-            for ingredient in ingredients_data
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in rows
         ]
-        IngredientsInRecipe.objects.bulk_create(ingredients_to_create)
+        if to_delete:
+            IngredientsInRecipe.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            IngredientsInRecipe.objects.bulk_update(to_update, ["amount"])
+        if to_create:
+            IngredientsInRecipe.objects.bulk_create(to_create)
+        if not created:
+            ShoppingListItem.objects.change_recipe(
+                recipe, old_amounts, new_amounts
+            )
+        return bool(to_create or to_delete)
+
+    def _set_tags(self, recipe, tags_data, created=False):
+        """Вставить недостающие связи с тегами и удалить лишние."""
+        through = Recipe.tags.through
+        new_ids = {tag.id for tag in tags_data}
+        old_ids = (
+            set()
+            if created
+            else set(
+                through.objects.filter(recipe=recipe).values_list(
+                    "tag_id", flat=True
+                )
+            )
+        )
+        if old_ids - new_ids:
+            through.objects.filter(
+                recipe=recipe, tag_id__in=old_ids - new_ids
+            ).delete()
+        if new_ids - old_ids:
+            through.objects.bulk_create(
+                through(recipe=recipe, tag_id=tag_id)
+                for tag_id in new_ids - old_ids
+            )
 
     def to_representation(self, instance):
         from api.serializers import RecipeReadSerializer
 
+        prefetch_related_objects(
+            [instance], "tags", "ingredients_amounts__ingredient"
+        )
         return RecipeReadSerializer(instance, context=self.context).data
 
-    def _set_tags_and_ingredients(self, recipe, tags_data, ingredients_data):
-        """Едины метод для тегов и ингредиентов."""
-        recipe.tags.set(tags_data)
-        recipe.ingredients_amounts.all().delete()
-        self._create_ingredients(recipe, ingredients_data)
-
+    @transaction.atomic(savepoint=False)
     def create(self, validated_data):
         """Создание рецепта."""
         ingredients_data = validated_data.pop("ingredients")
         tags_data = validated_data.pop("tags")
 
         recipe = Recipe.objects.create(**validated_data)
-        self._set_tags_and_ingredients(recipe, tags_data, ingredients_data)
+        self._set_tags(recipe, tags_data, created=True)
+        self._set_ingredients(recipe, ingredients_data, created=True)
+        update_search_vectors([recipe.pk])
+        enqueue_image(recipe, "image")
         return recipe
 
+    @transaction.atomic(savepoint=False)
     def update(self, instance, validated_data):
         """Обновление рецепта."""
-        ingredients_data = validated_data.pop("ingredients", None)
-        tags_data = validated_data.pop("tags", None)
-
-        if ingredients_data is None:
-            raise serializers.ValidationError(
-                {"ingredients": "Поле обязательно при обновлении рецепта."}
-            )
-        if tags_data is None:
-            raise serializers.ValidationError(
-                {"tags": "Поле обязательно при обновлении рецепта."}
-            )
+        ingredients_data = validated_data.pop("ingredients")
+        tags_data = validated_data.pop("tags")
 
-        instance = super().update(instance, validated_data)
-        self._set_tags_and_ingredients(instance, tags_data, ingredients_data)
+        # Пишутся только изменённые поля; новое фото сохраняется всегда.
+        # Версия меняется тем же UPDATE: теги и ингредиенты могли
+        # измениться и без полей рецепта.
+        changed = [
+            field
+            for field, value in validated_data.items()
+            if field == "image" or getattr(instance, field) != value
+        ]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        instance.version = F("version") + 1
+        instance.save(update_fields=[*changed, "version"])
+        # Иначе в version остаётся выражение F() до конца запроса.
+        instance.refresh_from_db(fields=["version"])
+        self._set_tags(instance, tags_data)
+        ingredients_changed = self._set_ingredients(instance, ingredients_data)
+        if ingredients_changed or {"name", "text"} & set(changed):
+            update_search_vectors([instance.pk])
+        if "image" in changed:
+            enqueue_image(instance, "image")
 
         return instance
 
@@ -405,6 +585,13 @@ class AvatarUpdateSerializer(serializers.ModelSerializer):
         model = User
         fields = ("avatar",)
 
+    def update(self, instance, validated_data):
+        """Пишется только аватар: счётчики в instance могли устареть."""
+        instance.avatar = validated_data["avatar"]
+        instance.save(update_fields=["avatar"])
+        enqueue_image(instance, "avatar")
+        return instance
+
 
 class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор модели Подписок"""
@@ -445,6 +632,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
+    avatar_srcset = SrcsetField(source="avatar_variants")
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.IntegerField(read_only=True, default=0)
 
@@ -460,13 +648,11 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             "recipes",
             "recipes_count",
             "avatar",
+            "avatar_srcset",
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return request.user.follower.filter(author=obj).exists()
-        return False
+        return obj.id in get_followed_author_ids(self.context)
 
     def get_avatar(self, obj):
         request = self.context.get("request")
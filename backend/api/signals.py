@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_user_cache
+from api.cache import payload_cache
+from api.filters import TAG_IDS_CACHE_KEY
+from recipes.models import Ingredient, Tag
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_payload_cache(sender, **kwargs):
+    """Сбросить закешированные ответы справочника."""
+    payload_cache.invalidate(sender)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tag_ids(**kwargs):
+    """Сбросить кеш {slug: id} для фильтра по тегам."""
+    cache.delete(TAG_IDS_CACHE_KEY)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Выход (djoser token/logout) удаляет токен — забыть его."""
+    token_user_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Смена пароля, деактивация и другие правки пользователя."""
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+        "key", flat=True
+    ):
+        token_user_cache.invalidate(key)
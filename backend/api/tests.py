@@ -0,0 +1,471 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.middleware import QueryBudgetExceeded
+from recipes.models import (
+    Ingredient,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingBasket,
+    ShoppingListItem,
+    Tag,
+)
+from users.models import Follow
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# Превышение QUERY_BUDGETS в тестах API — ошибка, а не строка в логе.
+query_budget = override_settings(
+    QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=True
+)
+
+
+def image_data_url():
+    buffer = BytesIO()
+    Image.new("RGB", (20, 20), (200, 120, 60)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, IMAGE_PROCESSING_ASYNC=True, FEED_FAN_OUT_ASYNC=True
+)
+@query_budget
+class RecipeWriteQueriesTest(TestCase):
+    """Число запросов при создании и изменении рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email="author@example.com",
+            username="author",
+            first_name="Автор",
+            last_name="Рецептов",
+            password="password",
+        )
+        cls.reader = User.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            first_name="Читатель",
+            last_name="Рецептов",
+            password="password",
+        )
+        cls.tags = [
+            Tag.objects.create(name=f"Тег {number}", slug=f"tag{number}")
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f"Ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(6)
+        ]
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name="Суп",
+            text="Сварить",
+            cooking_time=10,
+            image="recipes/images/soup.png",
+        )
+        cls.recipe.tags.set(cls.tags[:2])
+        IngredientsInRecipe.objects.bulk_create(
+            IngredientsInRecipe(
+                recipe=cls.recipe, ingredient=ingredient, amount=100
+            )
+            for ingredient in cls.ingredients[:3]
+        )
+        ShoppingBasket.objects.create(user=cls.reader, recipe=cls.recipe)
+        ShoppingListItem.objects.rebuild([cls.reader.pk])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.url = f"/api/recipes/{self.recipe.pk}/"
+
+    def payload(self, tags, amounts):
+        return {
+            "name": "Суп",
+            "text": "Сварить",
+            "cooking_time": 10,
+            "tags": [tag.pk for tag in tags],
+            "ingredients": [
+                {"id": ingredient.pk, "amount": amount}
+                for ingredient, amount in amounts
+            ],
+        }
+
+    def current_amounts(self):
+        return dict(
+            IngredientsInRecipe.objects.filter(
+                recipe=self.recipe
+            ).values_list("ingredient_id", "amount")
+        )
+
+    def test_create(self):
+        data = self.payload(
+            self.tags[:2],
+            [(ingredient, 50) for ingredient in self.ingredients[:3]],
+        )
+        data["image"] = image_data_url()
+        with self.assertNumQueries(21):
+            response = self.client.post("/api/recipes/", data, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_patch_without_changes(self):
+        data = self.payload(
+            self.tags[:2],
+            [(ingredient, 100) for ingredient in self.ingredients[:3]],
+        )
+        with self.assertNumQueries(14):
+            response = self.client.patch(self.url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.version, 2)
+
+    def test_patch_one_amount(self):
+        amounts = [(ingredient, 100) for ingredient in self.ingredients[:3]]
+        amounts[0] = (self.ingredients[0], 250)
+        with self.assertNumQueries(19):
+            response = self.client.patch(
+                self.url,
+                self.payload(self.tags[:2], amounts),
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.current_amounts()[self.ingredients[0].pk], 250)
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=self.reader, ingredient=self.ingredients[0]
+            ).total_amount,
+            250,
+        )
+
+    def test_patch_ingredients_and_tags(self):
+        amounts = [
+            (self.ingredients[1], 100),
+            (self.ingredients[2], 300),
+            (self.ingredients[4], 40),
+            (self.ingredients[5], 60),
+        ]
+        with self.assertNumQueries(26):
+            response = self.client.patch(
+                self.url,
+                self.payload(self.tags[1:], amounts),
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.current_amounts(),
+            {ingredient.pk: amount for ingredient, amount in amounts},
+        )
+        self.assertEqual(
+            set(self.recipe.tags.values_list("pk", flat=True)),
+            {tag.pk for tag in self.tags[1:]},
+        )
+        self.assertFalse(
+            ShoppingListItem.objects.filter(
+                user=self.reader, ingredient=self.ingredients[0]
+            ).exists()
+        )
+
+
+@query_budget
+@override_settings(RECIPE_DOCUMENT_CACHE=False)
+class RecipeReadQueriesTest(TestCase):
+    """Число запросов списка и рецепта не зависит от числа рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f"user{number}@example.com",
+                username=f"user{number}",
+                first_name="Пользователь",
+                last_name=str(number),
+                password="password",
+            )
+            for number in range(4)
+        ]
+        cls.reader = cls.users[0]
+        tags = [
+            Tag.objects.create(name=f"Тег {number}", slug=f"tag{number}")
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f"Ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(5)
+        ]
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.users[1 + number % 3],
+                name=f"Рецепт {number}",
+                text="Приготовить",
+                cooking_time=5,
+                image="recipes/images/recipe.png",
+            )
+            recipe.tags.set(tags[: 1 + number % 3])
+            IngredientsInRecipe.objects.bulk_create(
+                IngredientsInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+                for ingredient in ingredients[number % 3:]
+            )
+            if number % 2:
+                ShoppingBasket.objects.create(user=cls.reader, recipe=recipe)
+        cls.recipe = recipe
+        Follow.objects.create(user=cls.reader, author=recipe.author)
+
+    def client_for(self, user):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def assert_list_queries(self, user, expected):
+        client = self.client_for(user)
+        for limit in (1, 6, 12):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(expected):
+                    response = client.get(f"/api/recipes/?limit={limit}")
+                self.assertEqual(len(response.data["results"]), limit)
+
+    def test_list_anonymous(self):
+        self.assert_list_queries(None, 5)
+
+    def test_list_authenticated(self):
+        self.assert_list_queries(self.reader, 6)
+
+    def test_retrieve_anonymous(self):
+        with self.assertNumQueries(4):
+            response = self.client_for(None).get(
+                f"/api/recipes/{self.recipe.pk}/"
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_authenticated(self):
+        with self.assertNumQueries(5):
+            response = self.client_for(self.reader).get(
+                f"/api/recipes/{self.recipe.pk}/"
+            )
+        self.assertTrue(response.data["is_in_shopping_cart"])
+        self.assertTrue(response.data["author"]["is_subscribed"])
+
+    @override_settings(RECIPE_DOCUMENT_CACHE=True)
+    def test_retrieve_cached_document(self):
+        client = self.client_for(self.reader)
+        expected = client.get(f"/api/recipes/{self.recipe.pk}/").content
+        with self.assertNumQueries(1):
+            response = client.get(f"/api/recipes/{self.recipe.pk}/")
+        self.assertEqual(response.content, expected)
+
+
+@query_budget
+class ShoppingListTest(TestCase):
+    """Список покупок совпадает с пересчётом по корзинам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email="author@example.com",
+            username="author",
+            first_name="Автор",
+            last_name="Рецептов",
+            password="password",
+        )
+        cls.reader = User.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            first_name="Читатель",
+            last_name="Рецептов",
+            password="password",
+        )
+        cls.tag = Tag.objects.create(name="Обед", slug="lunch")
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f"Ингредиент {number}", measurement_unit="г"
+            )
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f"Рецепт {number}",
+                text="Приготовить",
+                cooking_time=5,
+                image="recipes/images/recipe.png",
+            )
+            recipe.tags.set([cls.tag])
+            IngredientsInRecipe.objects.bulk_create(
+                IngredientsInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+                for ingredient in cls.ingredients[number:number + 2]
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def shopping_list(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.reader).values_list(
+                "ingredient_id", "total_amount"
+            )
+        )
+
+    def assert_shopping_list(self, expected):
+        self.assertEqual(self.shopping_list(), expected)
+        self.assertEqual(
+            ShoppingListItem.objects.expected_totals([self.reader.pk]),
+            {
+                (self.reader.pk, ingredient_id): total
+                for ingredient_id, total in expected.items()
+            },
+        )
+
+    def cart_url(self, recipe):
+        return f"/api/recipes/{recipe.pk}/shopping_cart/"
+
+    def test_add_and_remove(self):
+        first, second, third = (
+            ingredient.pk for ingredient in self.ingredients
+        )
+        for recipe in self.recipes:
+            response = self.client.post(self.cart_url(recipe))
+            self.assertEqual(response.status_code, 201)
+        self.assert_shopping_list({first: 10, second: 20, third: 10})
+        response = self.client.delete(self.cart_url(self.recipes[0]))
+        self.assertEqual(response.status_code, 204)
+        self.assert_shopping_list({second: 10, third: 10})
+
+    def test_recipe_edit(self):
+        self.client.post(self.cart_url(self.recipes[0]))
+        author = APIClient()
+        author.force_authenticate(self.author)
+        response = author.patch(
+            f"/api/recipes/{self.recipes[0].pk}/",
+            {
+                "name": "Рецепт 0",
+                "text": "Приготовить",
+                "cooking_time": 5,
+                "tags": [self.tag.pk],
+                "ingredients": [
+                    {"id": self.ingredients[1].pk, "amount": 30},
+                    {"id": self.ingredients[2].pk, "amount": 5},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_shopping_list(
+            {self.ingredients[1].pk: 30, self.ingredients[2].pk: 5}
+        )
+
+
+@query_budget
+class QueryBudgetTest(TestCase):
+    """Server-Timing и проверка бюджета запросов."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_server_timing(self):
+        response = self.client.get("/api/recipes/")
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=\d+\.\d;desc="\d+ queries", app;dur=\d+\.\d$',
+        )
+
+    @override_settings(QUERY_BUDGETS={"recipes-list": 0})
+    def test_over_budget_raises(self):
+        with self.assertLogs("api.queries", "WARNING"):
+            with self.assertRaisesMessage(
+                QueryBudgetExceeded, "recipes-list"
+            ):
+                self.client.get("/api/recipes/")
+
+
+@query_budget
+class CursorPaginationTest(TestCase):
+    """Курсор по (pub_date, id) не теряет рецепты с одной датой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email="author@example.com",
+            username="author",
+            first_name="Автор",
+            last_name="Рецептов",
+            password="password",
+        )
+        for number in range(7):
+            Recipe.objects.create(
+                author=author,
+                name=f"Суп {number}",
+                text="Сварить",
+                cooking_time=5,
+                image="recipes/images/soup.png",
+            )
+        Recipe.objects.update(pub_date=timezone.now())
+        cls.expected = list(
+            Recipe.objects.order_by("-id").values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.append([recipe["id"] for recipe in response.data["results"]])
+            url = response.data[link]
+        return ids
+
+    def test_same_pub_date(self):
+        pages = self.walk("/api/recipes/?pagination=cursor&limit=3", "next")
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+        response = self.client.get(
+            "/api/recipes/?pagination=cursor&limit=3"
+        )
+        last = self.client.get(
+            self.client.get(response.data["next"]).data["next"]
+        )
+        pages = self.walk(last.data["previous"], "previous")
+        self.assertEqual(sum(reversed(pages), []), self.expected[:6])
+
+    def test_search_rejects_cursor(self):
+        response = self.client.get(
+            "/api/recipes/?pagination=cursor&search=суп"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pagination", response.data)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            "/api/recipes/?pagination=cursor&cursor=bm9wZQ"
+        )
+        self.assertEqual(response.status_code, 404)
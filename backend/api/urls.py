@@ -1,5 +1,6 @@
 """Маршруты для АПИ выполненые с помощью роутеров"""
 
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -33,3 +34,22 @@ urlpatterns = [
     path("auth/", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
 ]
+
+if settings.ASYNC_VIEWS:
+    from . import async_views
+
+    urlpatterns = [
+        path("users/me/", async_views.user_me_view, name="user-me"),
+        path("recipes/", async_views.recipe_list_view, name="recipes-list"),
+        path(
+            "recipes/<int:pk>/",
+            async_views.recipe_detail_view,
+            name="recipes-detail",
+        ),
+        path("tags/", async_views.tag_list_view, name="tag-list"),
+        path(
+            "ingredients/",
+            async_views.ingredient_list_view,
+            name="ingredients-list",
+        ),
+    ] + urlpatterns
@@ -1,14 +1,26 @@
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Value,
+    Window,
+)
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.parsers import JSONParser
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
 from api.serializers import (
@@ -23,19 +35,35 @@ from api.serializers import (
     SubscriptionSerializer,
     TagSerializer,
 )
+from recipes.autocomplete import ingredient_index
+from recipes.feed import (
+    decode_cursor,
+    encode_cursor,
+    enqueue_fan_out,
+    get_feed_page,
+)
+from recipes.images import store_variants
 from recipes.models import (
     Favorite,
     Ingredient,
-    IngredientsInRecipe,
     Recipe,
     ShoppingBasket,
+    ShoppingListItem,
     Tag,
 )
 from users.models import Follow
 
+from .cache import (
+    DOCUMENT_FLAGS,
+    CachedPayloadMixin,
+    document_response,
+    make_document,
+    recipe_documents,
+)
 from .filters import IngredientFilter, RecipeFilter
-from .paginations import CustomPagination
+from .paginations import CustomCursorPagination, OptionalCursorPagination
 from .permissions import IsAuthorOrIsAdmin, IsAuthorOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS, stream_async
 from .serializers import (
     UserListSerializer,
     UserRegistrationSerializer,
@@ -52,10 +80,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
         "tags", "ingredients_amounts__ingredient"
     )
     permission_classes = [IsAuthorOrIsAdmin, IsAuthorOrReadOnly]
-    pagination_class = CustomPagination
+    pagination_class = OptionalCursorPagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    @property
+    def cursor_ordering(self):
+        # Курсор по дате потерял бы порядок поиска по релевантности.
+        if self.request.query_params.get("search"):
+            return None
+        return ("-pub_date", "-id")
+
+    def get_queryset(self):
+        """Флаги избранного и корзины считаются подзапросами EXISTS."""
+        queryset = super().get_queryset()
+        if self.action in ("update", "partial_update", "destroy"):
+            # Ответ на изменение сам подгружает теги и ингредиенты.
+            queryset = queryset.prefetch_related(None)
+        user = self.request.user
+        if user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingBasket.objects.filter(
+                        user=user, recipe=OuterRef("pk")
+                    )
+                ),
+            )
+        return queryset.annotate(
+            is_favorited=Value(False), is_in_shopping_cart=Value(False)
+        )
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
@@ -66,9 +123,60 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_document_lookup(self, pk):
+        """Версия рецепта и флаги пользователя одним запросом."""
+        user = self.request.user
+        is_subscribed = Value(False)
+        if user.is_authenticated:
+            is_subscribed = Exists(
+                Follow.objects.filter(user=user, author=OuterRef("author"))
+            )
+        return (
+            self.get_queryset()
+            .prefetch_related(None)
+            .filter(pk=pk)
+            .annotate(is_subscribed=is_subscribed)
+            .values("id", "version", *DOCUMENT_FLAGS)
+        )
+
+    def get_document_context(self):
+        # is_subscribed подставляется при ответе, подписки не нужны.
+        return {**self.get_serializer_context(), "followed_author_ids": ()}
+
+    def retrieve(self, request, *args, **kwargs):
+        """Документ рецепта из кеша, флаги пользователя — из базы.
+
+        Запросы с параметрами и браузерный API идут обычным путём.
+        """
+        if (
+            not settings.RECIPE_DOCUMENT_CACHE
+            or request.query_params
+            or request.accepted_renderer.format != "json"
+        ):
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            flags = self.get_document_lookup(kwargs["pk"]).first()
+        except ValueError:
+            flags = None
+        if flags is None:
+            return super().retrieve(request, *args, **kwargs)
+        key = recipe_documents.make_key(request, flags["id"], flags["version"])
+        document = recipe_documents.get(key)
+        if document is None:
+            serializer = self.get_serializer(
+                self.get_object(), context=self.get_document_context()
+            )
+            document = recipe_documents.set(
+                key, make_document(serializer.data)
+            )
+        return document_response(document, flags)
+
+    @transaction.atomic
     def perform_create(self, serializer):
         self.instance = serializer.save(author=self.request.user)
+        enqueue_fan_out(self.instance)
 
+    @transaction.atomic
     def perform_update(self, serializer):
         self.instance = serializer.save()
 
@@ -102,7 +210,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 data={"recipe": recipe.id}, context={"request": request}
             )
             favorite_serializer.is_valid(raise_exception=True)
-            favorite_serializer.save(user=user)
+            with transaction.atomic():
+                favorite_serializer.save(user=user)
             serializer = RecipeShortSerializer(
                 recipe, context={"request": request}
             )
@@ -143,7 +252,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 context={"request": request},
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                ShoppingListItem.objects.add_recipe(user, recipe)
             output_serializer = RecipeShortSerializer(
                 recipe, context={"request": request}
             )
@@ -153,9 +264,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         elif request.method == "DELETE":
             """Удаление из корзины."""
-            deleted_count, _ = ShoppingBasket.objects.filter(
-                user=user, recipe=recipe
-            ).delete()
+            with transaction.atomic():
+                deleted_count, _ = ShoppingBasket.objects.filter(
+                    user=user, recipe=recipe
+                ).delete()
+                if deleted_count:
+                    ShoppingListItem.objects.remove_recipe(user, recipe)
 
             if deleted_count == 0:
                 return Response(
@@ -164,44 +278,83 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 )
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def _generate_shopping_list_content(self, user):
-        """Генерация содержимого списка покупок"""
-        ingredients = (
-            IngredientsInRecipe.objects.filter(
-                recipe__in_shopping_basket__user=user
+    def _get_shopping_list_ingredients(self, user):
+        """Суммарное количество ингредиентов из корзины пользователя."""
+        return (
+            ShoppingListItem.objects.filter(user=user)
+            .values(
+                "total_amount",
+                name=F("ingredient__name"),
+                measurement_unit=F("ingredient__measurement_unit"),
             )
-            .values("ingredient__name", "ingredient__measurement_unit")
-            .annotate(total_amount=Sum("amount"))
+            .order_by("name")
+            .iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
         )
 
-        shopping_list = "Список покупок:\n\n"
-        for item in ingredients:
-            name = item["ingredient__name"]
-            amount = item["total_amount"]
-            unit = item["ingredient__measurement_unit"]
-            shopping_list += f"- {name} - {amount} {unit}\n"
-        shopping_list += f"\nВсего ингредиентов: {len(ingredients)}"
-
-        return shopping_list
-
     @action(
-        detail=False, methods=["get"], permission_classes=[IsAuthenticated]
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        """Скачать список покупок с оптимизацией запросов."""
-        user = request.user
-        shopping_list_content = self._generate_shopping_list_content(user)
-
-        response = HttpResponse(
-            shopping_list_content, content_type="text/plain; charset=utf-8"
+        """Скачать список покупок в формате txt, csv или json.
+
+        Формат выбирается параметром ?format=, файл отдаётся потоком.
+        """
+        renderer = request.accepted_renderer
+        ingredients = self._get_shopping_list_ingredients(request.user)
+        content = renderer.stream(ingredients)
+        if settings.ASYNC_VIEWS:
+            content = stream_async(
+                content, settings.SHOPPING_LIST_CHUNK_SIZE
+            )
+        response = StreamingHttpResponse(
+            content,
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
         )
         response["Content-Disposition"] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
         return response
 
+    @action(
+        detail=False, methods=["get"], permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь.
+
+        Листается курсором ?cursor= из ссылки next, размер — ?limit=.
+        """
+        cursor = request.query_params.get("cursor")
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            raise NotFound("Неверный курсор.")
+        limit = CustomCursorPagination().get_page_size(request)
+        page = get_feed_page(request.user, limit + 1, before)
+        next_link = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                "cursor",
+                encode_cursor(page[-1]),
+            )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        serializer = RecipeReadSerializer(
+            [recipes[pk] for pk, _ in page if pk in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response(
+            {"next": next_link, "previous": None, "results": serializer.data}
+        )
+
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedPayloadMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для Ингридиентов."""
 
     queryset = Ingredient.objects.all()
@@ -209,8 +362,27 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     filterset_class = IngredientFilter
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list" and self.request.query_params.get("name"):
+            return queryset[: settings.INGREDIENT_AUTOCOMPLETE_LIMIT]
+        return queryset
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    def list(self, request, *args, **kwargs):
+        """Автодополнение по ?name= обслуживается из памяти процесса."""
+        name = request.query_params.get("name")
+        if name and settings.INGREDIENT_INDEX_IN_MEMORY:
+            return Response(
+                ingredient_index.search(
+                    name,
+                    settings.INGREDIENT_AUTOCOMPLETE_LIMIT,
+                    contains=settings.INGREDIENT_AUTOCOMPLETE_CONTAINS,
+                )
+            )
+        return super().list(request, *args, **kwargs)
+
+
+class TagViewSet(CachedPayloadMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для Тег"""
 
     queryset = Tag.objects.all()
@@ -225,7 +397,13 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    pagination_class = CustomPagination
+    pagination_class = OptionalCursorPagination
+
+    @property
+    def cursor_ordering(self):
+        if self.action == "subscriptions":
+            return ("-followed_at", "-id")
+        return ("id",)
 
     def get_permissions(self):
         if self.action in ["create", "list", "retrieve"]:
@@ -252,7 +430,8 @@ class UserViewSet(viewsets.ModelViewSet):
                 data={"author": author.id}, context={"request": request}
             )
             follow_serializer.is_valid(raise_exception=True)
-            follow_serializer.save(user=user)
+            with transaction.atomic():
+                follow_serializer.save(user=user)
             serializer = SubscriptionSerializer(
                 author,
                 context={"request": request},
@@ -278,10 +457,25 @@ class UserViewSet(viewsets.ModelViewSet):
     def subscriptions(self, request):
         """Список моих подписок."""
         user = request.user
+        recipes = Recipe.objects.only(
+            "id", "name", "image", "image_variants", "cooking_time", "author"
+        )
+        recipes_limit = request.query_params.get("recipes_limit")
+        if recipes_limit and recipes_limit.isdigit():
+            # Последние recipes_limit рецептов каждого автора выбираются
+            # одним запросом, лишние рецепты в память не загружаются.
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=F("pub_date").desc(),
+                )
+            ).filter(row_number__lte=int(recipes_limit))
         subscribed_authors = (
             User.objects.filter(following__user=user)
-            .prefetch_related("recipes")
-            .annotate(recipes_count=Count("recipes"))
+            .annotate(followed_at=F("following__created_at"))
+            .prefetch_related(Prefetch("recipes", queryset=recipes))
+            .order_by("-followed_at", "-id")
         )
         page = self.paginate_queryset(subscribed_authors)
         serializer = SubscriptionSerializer(
@@ -317,7 +511,7 @@ class UserAvatarView(APIView):
     """Вью для аватара."""
 
     permission_classes = [IsAuthenticated]
-    parser_classes = [JSONParser]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
 
     def put(self, request):
         """Обновление."""
@@ -330,7 +524,11 @@ class UserAvatarView(APIView):
         """Удаление."""
         user = request.user
         if user.avatar:
-            user.avatar.delete(save=True)
+            # Копии удаляются вместе с файлами, пока известно хранилище.
+            store_variants(user, "avatar", {})
+            # Только поле аватара: счётчики в request.user могли устареть.
+            user.avatar.delete(save=False)
+            user.save(update_fields=["avatar"])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -351,7 +549,7 @@ class ChangePassword(APIView):
             )
 
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=["password"])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -389,7 +587,8 @@ class FollowViewSet(viewsets.ModelViewSet):
         if request.method == "POST":
             serializer = self.get_serializer(data={"author": author.id})
             serializer.is_valid(raise_exception=True)
-            serializer.save(user=request.user)
+            with transaction.atomic():
+                serializer.save(user=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         elif request.method == "DELETE":
             deleted_count, _ = Follow.objects.filter(
@@ -410,8 +609,23 @@ class FavoriteListView(generics.ListAPIView):
 
     serializer_class = RecipeReadSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ("-added_at", "-id")
 
     def get_queryset(self):
-        return Favorite.objects.select_related(
-            "recipe", "recipe__author"
-        ).filter(user=self.request.user)
+        user = self.request.user
+        return (
+            Recipe.objects.filter(saved__user=user)
+            .select_related("author")
+            .prefetch_related("tags", "ingredients_amounts__ingredient")
+            .annotate(
+                added_at=F("saved__added_at"),
+                is_favorited=Value(True),
+                is_in_shopping_cart=Exists(
+                    ShoppingBasket.objects.filter(
+                        user=user, recipe=OuterRef("pk")
+                    )
+                ),
+            )
+            .order_by("-added_at", "-id")
+        )
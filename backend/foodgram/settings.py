@@ -25,6 +25,10 @@ CSRF_TRUSTED_ORIGINS = os.getenv(
     "https://foodisgood.duckdns.org,http://foodisgood.duckdns.org",
 ).split(",")
 
+# asgi — uvicorn-воркеры и асинхронные вьюхи для частых GET-запросов
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi").lower()
+ASYNC_VIEWS = SERVER_MODE == "asgi"
+
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 USE_X_FORWARDED_HOST = True
 USE_X_FORWARDED_PORT = True
@@ -39,6 +43,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "django_filters",
     "corsheaders",
     "rest_framework",
@@ -51,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.QueryBudgetMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -88,6 +94,10 @@ TEMPLATES = [
 WSGI_APPLICATION = "foodgram.wsgi.application"
 
 
+# Пул соединений psycopg. Под ASGI Django не советует постоянные
+# соединения, поэтому в этом режиме пул включён по умолчанию.
+DB_POOL = os.getenv("DB_POOL", str(SERVER_MODE == "asgi")).lower() == "true"
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -96,6 +106,30 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
         "HOST": os.getenv("DB_HOST", ""),
         "PORT": os.getenv("DB_PORT", 5432),
+        # С пулом соединения держит пул, CONN_MAX_AGE должен быть 0.
+        "CONN_MAX_AGE": (
+            0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", 60))
+        ),
+        "CONN_HEALTH_CHECKS": (
+            os.getenv("DB_CONN_HEALTH_CHECKS", "True").lower() == "true"
+        ),
+        # Нужно за pgbouncer в режиме transaction: .iterator() иначе
+        # открывает серверный курсор, который не переживает транзакцию.
+        "DISABLE_SERVER_SIDE_CURSORS": (
+            os.getenv("DB_DISABLE_SERVER_SIDE_CURSORS", "False").lower()
+            == "true"
+        ),
+        "OPTIONS": (
+            {
+                "pool": {
+                    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+                    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+                    "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+                }
+            }
+            if DB_POOL
+            else {}
+        ),
     }
 }
 
@@ -124,7 +158,7 @@ REST_FRAMEWORK = {
         "django_filters.rest_framework.DjangoFilterBackend",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 6,
@@ -159,7 +193,93 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+# Больше этого загрузки и декодированные base64-картинки пишутся на диск
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2560 * 1024
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
 
 PAGE_SIZE = 6
+
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
+INGREDIENT_AUTOCOMPLETE_LIMIT = 50
+INGREDIENT_AUTOCOMPLETE_CONTAINS = (
+    os.getenv("INGREDIENT_AUTOCOMPLETE_CONTAINS", "True").lower() == "true"
+)
+INGREDIENT_INDEX_IN_MEMORY = (
+    os.getenv("INGREDIENT_INDEX_IN_MEMORY", "True").lower() == "true"
+)
+INGREDIENT_INDEX_TTL = 300
+
+# Конфигурация PostgreSQL для полнотекстового поиска рецептов.
+RECIPE_SEARCH_CONFIG = "russian"
+
+REFERENCE_CACHE_TTL = 300
+
+TOKEN_AUTH_CACHE_TTL = int(os.getenv("TOKEN_AUTH_CACHE_TTL", 30))
+TOKEN_AUTH_CACHE_SIZE = 10000
+# Алиас из CACHES для общего между процессами кеша токенов
+TOKEN_AUTH_SHARED_CACHE = os.getenv("TOKEN_AUTH_SHARED_CACHE", "")
+
+RECIPE_DOCUMENT_CACHE = (
+    os.getenv("RECIPE_DOCUMENT_CACHE", "True").lower() == "true"
+)
+RECIPE_DOCUMENT_CACHE_SIZE = 5000
+# Алиас из CACHES для общего между процессами кеша документов рецептов
+RECIPE_DOCUMENT_SHARED_CACHE = os.getenv("RECIPE_DOCUMENT_SHARED_CACHE", "")
+RECIPE_DOCUMENT_CACHE_TTL = 24 * 60 * 60
+
+IMAGE_PROCESSING_ASYNC = (
+    os.getenv("IMAGE_PROCESSING_ASYNC", "True").lower() == "true"
+)
+IMAGE_PROCESSING_MAX_ATTEMPTS = 3
+# Через сколько секунд задачу упавшего воркера возьмёт другой
+IMAGE_PROCESSING_LEASE = int(os.getenv("IMAGE_PROCESSING_LEASE", 300))
+IMAGE_MAX_SIZE = 1920
+IMAGE_VARIANTS = {"thumb": 200, "card": 480, "full": 1280}
+IMAGE_EXTENSIONS = ("jpeg", "jpg", "png", "gif", "webp")
+# Кратно 4, чтобы каждая часть base64 декодировалась отдельно
+IMAGE_DECODE_CHUNK_SIZE = 64 * 1024
+
+FEED_FAN_OUT_ASYNC = os.getenv("FEED_FAN_OUT_ASYNC", "True").lower() == "true"
+# У авторов с большим числом подписчиков лента собирается при чтении
+FEED_FAN_OUT_MAX_FOLLOWERS = int(
+    os.getenv("FEED_FAN_OUT_MAX_FOLLOWERS", 10000)
+)
+FEED_FAN_OUT_BATCH_SIZE = 1000
+FEED_FAN_OUT_MAX_ATTEMPTS = 3
+FEED_BACKFILL_SIZE = 100
+
+# Учёт SQL-запросов по каждому запросу: Server-Timing и лог api.queries.
+# Тесты API включают QUERY_BUDGET_RAISE: превышение бюджета — ошибка.
+QUERY_BUDGET_ENABLED = (
+    os.getenv("QUERY_BUDGET_ENABLED", "False").lower() == "true"
+)
+QUERY_BUDGET_RAISE = os.getenv("QUERY_BUDGET_RAISE", "False").lower() == "true"
+QUERY_BUDGET_DEFAULT = 30
+# Бюджеты GET: число запросов не должно зависеть от размера страницы.
+QUERY_BUDGETS = {
+    "recipes-list": 8,
+    "recipes-detail": 6,
+    "recipes-feed": 8,
+    "favorite-list": 8,
+    "user-list": 4,
+    "user-me": 2,
+    "user-detail": 3,
+    "user-subscriptions": 5,
+    "tag-list": 1,
+    "ingredients-list": 1,
+}
+QUERY_BUDGET_DUPLICATES = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "api.queries": {
+            "handlers": ["console"],
+            "level": os.getenv("QUERY_BUDGET_LOG_LEVEL", "WARNING"),
+            "propagate": False,
+        },
+    },
+}
@@ -0,0 +1,17 @@
+"""Настройки gunicorn, файл подхватывается из рабочего каталога.
+
+SERVER_MODE=asgi запускает приложение через uvicorn-воркеры
+(foodgram.asgi), иначе работают обычные синхронные воркеры
+(foodgram.wsgi).
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+
+if os.getenv("SERVER_MODE", "wsgi").lower() == "asgi":
+    worker_class = "uvicorn_worker.UvicornWorker"
+    wsgi_app = "foodgram.asgi:application"
+else:
+    wsgi_app = "foodgram.wsgi:application"
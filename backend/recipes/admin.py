@@ -1,16 +1,19 @@
 """Регистрацияя моделей из приложения рецептов"""
-from django.db.models import Count
 from django.contrib import admin
 from admin_auto_filters.filters import AutocompleteFilter
 
 from .models import (
     Favorite,
+    FeedTask,
+    ImageTask,
     Ingredient,
     IngredientsInRecipe,
     Recipe,
     ShoppingBasket,
+    ShoppingListItem,
     Tag,
 )
+from .search import update_search_vectors
 
 
 class AutoFilter(AutocompleteFilter):
@@ -41,9 +44,15 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("name", "author")
+    list_display = ("name", "author", "favorites_count", "image_status")
     search_fields = ("name",)
     list_filter = (AutoFilter, TagFilter)
+    readonly_fields = ("favorites_count",)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_vectors([form.instance.pk])
+        Recipe.objects.filter(pk=form.instance.pk).expire_documents()
 
     def get_queryset(self, request):
         return (
@@ -51,16 +60,8 @@ class RecipeAdmin(admin.ModelAdmin):
             .get_queryset(request)
             .select_related("author")
             .prefetch_related("tags", "ingredients_amounts__ingredient")
-            .annotate(favorites_count=(Count("saved")))
         )
 
-    def favorites_count(self, obj):
-        """Количество добавлений в избранное."""
-        return obj.favorites_count
-
-    favorites_count.short_description = "В избранном"
-    favorites_count.admin_order_field = "favorites_count"
-
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -73,6 +74,36 @@ class IngredientAdmin(admin.ModelAdmin):
 class IngredientInRecipeAdmin(admin.ModelAdmin):
     list_display = ("recipe", "ingredient", "amount")
 
+    @staticmethod
+    def recipes_changed(rows, sign):
+        """Применить строки к спискам покупок и обновить их рецепты.
+
+        sign=1 — строки добавлены, sign=-1 — удалены.
+        """
+        for row in rows:
+            amounts = {row.ingredient_id: row.amount}
+            old, new = ({}, amounts) if sign > 0 else (amounts, {})
+            ShoppingListItem.objects.change_recipe(row.recipe_id, old, new)
+        recipe_ids = list({row.recipe_id for row in rows})
+        update_search_vectors(recipe_ids)
+        Recipe.objects.filter(pk__in=recipe_ids).expire_documents()
+
+    def save_model(self, request, obj, form, change):
+        old = IngredientsInRecipe.objects.get(pk=obj.pk) if change else None
+        super().save_model(request, obj, form, change)
+        if old is not None:
+            self.recipes_changed([old], -1)
+        self.recipes_changed([obj], 1)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.recipes_changed([obj], -1)
+
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset)
+        super().delete_queryset(request, queryset)
+        self.recipes_changed(rows, -1)
+
     def get_queryset(self, request):
         return (
             super()
@@ -86,6 +117,27 @@ class ShoppingBasketAdmin(admin.ModelAdmin):
     list_display = ("user", "recipe", "added_at")
     list_filter = (UserFilter, RecipeFilter)
 
+    def save_model(self, request, obj, form, change):
+        old = (
+            ShoppingBasket.objects.select_related("user").get(pk=obj.pk)
+            if change
+            else None
+        )
+        super().save_model(request, obj, form, change)
+        if old is not None:
+            ShoppingListItem.objects.remove_recipe(old.user, old.recipe_id)
+        ShoppingListItem.objects.add_recipe(obj.user, obj.recipe)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ShoppingListItem.objects.remove_recipe(obj.user, obj.recipe)
+
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset)
+        super().delete_queryset(request, queryset)
+        for row in rows:
+            ShoppingListItem.objects.remove_recipe(row.user, row.recipe)
+
     def get_queryset(self, request):
         return (
             super()
@@ -105,3 +157,28 @@ class FavoritesAdmin(admin.ModelAdmin):
             .get_queryset(request)
             .select_related("user", "recipe")
         )
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ("user", "ingredient", "total_amount")
+    list_filter = (UserFilter,)
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("user", "ingredient")
+        )
+
+
+@admin.register(ImageTask)
+class ImageTaskAdmin(admin.ModelAdmin):
+    list_display = (
+        "content_type", "object_id", "field_name", "attempts", "locked_until"
+    )
+
+
+@admin.register(FeedTask)
+class FeedTaskAdmin(admin.ModelAdmin):
+    list_display = ("recipe", "attempts", "created_at")
@@ -0,0 +1,79 @@
+"""Автодополнение ингредиентов из памяти процесса."""
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """Отсортированный по названию список ингредиентов.
+
+    Строится при первом поиске, сбрасывается сигналами при изменении
+    ингредиентов и перестраивается не реже раза в
+    INGREDIENT_INDEX_TTL секунд, чтобы подхватить изменения,
+    сделанные другими процессами.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _expired(self):
+        return (
+            time.monotonic() - self._built_at >= settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _build(self):
+        rows = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            ).iterator()
+        )
+        self._snapshot = ([row[0] for row in rows], rows)
+        self._built_at = time.monotonic()
+        return self._snapshot
+
+    def _get_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None or self._expired():
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or self._expired():
+                    snapshot = self._build()
+        return snapshot
+
+    def search(self, value, limit, contains=True):
+        """Ингредиенты, начинающиеся с value, затем содержащие value."""
+        keys, rows = self._get_snapshot()
+        value = value.lower()
+        found = []
+        position = bisect_left(keys, value)
+        while (
+            len(found) < limit
+            and position < len(keys)
+            and keys[position].startswith(value)
+        ):
+            found.append(rows[position])
+            position += 1
+        if contains:
+            for key, row in zip(keys, rows):
+                if len(found) >= limit:
+                    break
+                if value in key and not key.startswith(value):
+                    found.append(row)
+        return [
+            {"id": pk, "name": name, "measurement_unit": measurement_unit}
+            for _, pk, name, measurement_unit in found
+        ]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,147 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+Новые рецепты раскладываются по лентам подписчиков (FeedItem) фоновой
+командой fan_out_feed. Рецепты авторов, у которых больше
+FEED_FAN_OUT_MAX_FOLLOWERS подписчиков, не раскладываются: при чтении
+ленты они добавляются запросом по индексу (author, -pub_date).
+"""
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import FeedItem, FeedTask, Recipe
+from users.models import Follow
+
+
+def has_feed_fan_out(author):
+    return author.followers_count <= settings.FEED_FAN_OUT_MAX_FOLLOWERS
+
+
+def add_to_feeds(recipe):
+    """Добавить рецепт в ленты всех подписчиков автора пачками."""
+    follower_ids = (
+        Follow.objects.filter(author_id=recipe.author_id)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
+    batch = []
+    for user_id in follower_ids.iterator(
+        chunk_size=settings.FEED_FAN_OUT_BATCH_SIZE
+    ):
+        batch.append(
+            FeedItem(user_id=user_id, recipe=recipe, pub_date=recipe.pub_date)
+        )
+        if len(batch) >= settings.FEED_FAN_OUT_BATCH_SIZE:
+            FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def enqueue_fan_out(recipe):
+    """Поставить рассылку рецепта в очередь или выполнить сразу.
+
+    Без FEED_FAN_OUT_ASYNC рецепт раскладывается в запросе.
+    """
+    if not has_feed_fan_out(recipe.author):
+        return
+    if not settings.FEED_FAN_OUT_ASYNC:
+        add_to_feeds(recipe)
+        return
+    FeedTask.objects.bulk_create(
+        [FeedTask(recipe=recipe)], ignore_conflicts=True
+    )
+
+
+def process_next_task():
+    """Выполнить одну рассылку из очереди. False, если очередь пуста."""
+    with transaction.atomic():
+        task = (
+            FeedTask.objects.select_for_update(skip_locked=True)
+            .select_related("recipe__author")
+            .order_by("created_at")
+            .first()
+        )
+        if task is None:
+            return False
+        try:
+            with transaction.atomic():
+                if has_feed_fan_out(task.recipe.author):
+                    add_to_feeds(task.recipe)
+        except Exception:
+            task.attempts += 1
+            if task.attempts < settings.FEED_FAN_OUT_MAX_ATTEMPTS:
+                task.save(update_fields=["attempts"])
+                return True
+        task.delete()
+    return True
+
+
+def backfill_feed(user_id, author):
+    """Добавить в ленту последние рецепты нового автора подписки."""
+    if not has_feed_fan_out(author):
+        return
+    recipes = Recipe.objects.filter(author=author).values_list(
+        "id", "pub_date"
+    )[: settings.FEED_BACKFILL_SIZE]
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in recipes
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def get_feed_page(user, limit, before=None):
+    """Пары (id, pub_date) рецептов ленты, новые первыми.
+
+    Разложенная часть — один проход по индексу ленты пользователя,
+    популярные авторы — проход по индексу рецептов автора. before —
+    позиция (pub_date, id), после которой продолжается лента.
+    """
+    items = FeedItem.objects.filter(user=user).values_list(
+        "recipe_id", "pub_date"
+    )
+    popular = Recipe.objects.filter(
+        author__in=Follow.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.FEED_FAN_OUT_MAX_FOLLOWERS,
+        ).values("author")
+    ).values_list("id", "pub_date")
+    if before is not None:
+        pub_date, recipe_id = before
+        items = items.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        )
+        popular = popular.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=recipe_id)
+        )
+    items = items.order_by("-pub_date", "-recipe_id")[:limit]
+    popular = popular.order_by("-pub_date", "-id")[:limit]
+    return list(
+        items.union(popular).order_by("-pub_date", "-recipe_id")[:limit]
+    )
+
+
+def encode_cursor(position):
+    recipe_id, pub_date = position
+    return base64.urlsafe_b64encode(
+        f"{pub_date.isoformat()}|{recipe_id}".encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    """(pub_date, id) из курсора; ValueError, если курсор испорчен."""
+    try:
+        pub_date, recipe_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(pub_date), int(recipe_id)
+    except (binascii.Error, UnicodeError) as error:
+        raise ValueError(error)
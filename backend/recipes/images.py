@@ -0,0 +1,292 @@
+"""Фоновая обработка загруженных изображений."""
+
+import hashlib
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.models import ImageStatus, ImageTask
+
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+    "WEBP": {"quality": 85},
+}
+VARIANT_FORMATS = (("webp", "WEBP"), ("jpeg", "JPEG"))
+
+# Поля картинки (статус, копии) записаны UPDATE, в обход post_save.
+image_updated = Signal()
+
+
+def render_image(field_file):
+    """Проверить картинку, повернуть по EXIF, уменьшить и перекодировать.
+
+    Pillow не переносит метаданные при сохранении, поэтому EXIF
+    (геометки, модель камеры) из файла удаляется. Возвращает новое
+    содержимое файла и закодированные копии (см. render_variants) или
+    None для анимированных картинок: их не трогаем. Ничего не пишет,
+    поэтому воркер вызывает её вне транзакции.
+    """
+    with field_file.open("rb") as file:
+        image = Image.open(file)
+        image.load()
+    image_format = image.format
+    if getattr(image, "is_animated", False):
+        return None
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((settings.IMAGE_MAX_SIZE, settings.IMAGE_MAX_SIZE))
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(
+        buffer, format=image_format, **SAVE_OPTIONS.get(image_format, {})
+    )
+    return buffer.getvalue(), render_variants(image)
+
+
+def render_variants(image):
+    """Закодировать копии шириной IMAGE_VARIANTS в WebP и JPEG.
+
+    Картинка уже нужной ширины не увеличивается.
+    """
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    variants = {}
+    for label, width in settings.IMAGE_VARIANTS.items():
+        rendition = image
+        if image.width > width:
+            rendition = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS,
+            )
+        variant = {"width": rendition.width}
+        for extension, image_format in VARIANT_FORMATS:
+            buffer = BytesIO()
+            rendition.save(
+                buffer, format=image_format, **SAVE_OPTIONS[image_format]
+            )
+            variant[extension] = buffer.getvalue()
+        variants[label] = variant
+    return variants
+
+
+def store_image(field_file, rendered):
+    """Записать результат render_image, если поле всё ещё на этом файле.
+
+    Новый файл сохраняется под свободным именем, которое выберет
+    хранилище, а старый удаляется только после фиксации транзакции:
+    при откате поле по-прежнему указывает на существующий файл.
+    Возвращает словарь копий (см. save_variants). Если пока картинка
+    обрабатывалась, в поле загрузили другую, записанные файлы удаляются
+    и возвращается None.
+    """
+    instance = field_file.instance
+    field_name = field_file.field.name
+    storage = field_file.storage
+    old_name = field_file.name
+    name, variants = old_name, {}
+    if rendered is not None:
+        content, rendered_variants = rendered
+        name = storage.save(old_name, ContentFile(content))
+        variants = save_variants(rendered_variants, name, storage)
+    # UPDATE с прежним именем в условии блокирует строку до конца
+    # транзакции и не затирает картинку, загруженную за это время.
+    updated = (
+        type(instance)
+        .objects.filter(pk=instance.pk, **{field_name: old_name})
+        .update(**{field_name: name})
+    )
+    if not updated:
+        if name != old_name:
+            storage.delete(name)
+        for path in variant_paths(variants):
+            storage.delete(path)
+        return None
+    if name != old_name:
+        field_file.name = name
+        delete_on_commit(storage, [old_name])
+    return variants
+
+
+def process_image(field_file):
+    """Обработать картинку в запросе и записать результат."""
+    return store_image(field_file, render_image(field_file))
+
+
+def save_variants(variants, name, storage):
+    """Сохранить копии из render_variants рядом с оригиналом.
+
+    Файлы лежат в подкаталоге variants, и nginx отдаёт их из MEDIA_ROOT
+    без участия Django как неизменяемые: в имени есть хеш содержимого,
+    поэтому один путь всегда означает один файл, даже если имя
+    оригинала позже достанется другой загрузке.
+    """
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    saved = {}
+    for label, variant in variants.items():
+        saved[label] = {"width": variant["width"]}
+        for extension, _ in VARIANT_FORMATS:
+            content = variant[extension]
+            digest = hashlib.sha256(content).hexdigest()[:16]
+            path = os.path.join(
+                directory, "variants", f"{stem}_{label}_{digest}.{extension}"
+            )
+            if not storage.exists(path):
+                path = storage.save(path, ContentFile(content))
+            saved[label][extension] = path
+    return saved
+
+
+def delete_on_commit(storage, paths):
+    """Удалить файлы после фиксации транзакции, а при откате оставить."""
+    paths = list(paths)
+
+    def delete():
+        for path in paths:
+            storage.delete(path)
+
+    if paths:
+        transaction.on_commit(delete)
+
+
+def variant_paths(variants):
+    return {
+        variant[extension]
+        for variant in variants.values()
+        for extension, _ in VARIANT_FORMATS
+        if variant.get(extension)
+    }
+
+
+def store_variants(instance, field_name, variants):
+    """Записать копии в {field_name}_variants и удалить прежние файлы."""
+    variants_field = f"{field_name}_variants"
+    if not hasattr(instance, variants_field):
+        return
+    if getattr(instance, variants_field) == variants:
+        return
+    old_paths = variant_paths(getattr(instance, variants_field) or {})
+    setattr(instance, variants_field, variants)
+    type(instance).objects.filter(pk=instance.pk).update(
+        **{variants_field: variants}
+    )
+    image_updated.send(sender=type(instance), instance=instance)
+    delete_on_commit(
+        getattr(instance, field_name).storage,
+        old_paths - variant_paths(variants),
+    )
+
+
+def set_image_status(instance, field_name, status):
+    status_field = f"{field_name}_status"
+    if hasattr(instance, status_field):
+        setattr(instance, status_field, status)
+        type(instance).objects.filter(pk=instance.pk).update(
+            **{status_field: status}
+        )
+        image_updated.send(sender=type(instance), instance=instance)
+
+
+def enqueue_image(instance, field_name):
+    """Поставить изображение в очередь или обработать сразу.
+
+    Без IMAGE_PROCESSING_ASYNC изображение обрабатывается в запросе.
+    """
+    if not getattr(instance, field_name):
+        return
+    if not settings.IMAGE_PROCESSING_ASYNC:
+        variants = process_image(getattr(instance, field_name))
+        if variants is not None:
+            store_variants(instance, field_name, variants)
+        return
+    set_image_status(instance, field_name, ImageStatus.PENDING)
+    store_variants(instance, field_name, {})
+    # Одним INSERT ... ON CONFLICT без лишнего SELECT и точки сохранения
+    # внутри транзакции записи рецепта. Если задача уже есть, она
+    # сбрасывается: новую картинку обработают, даже когда воркер сейчас
+    # занят прежней.
+    ImageTask.objects.bulk_create(
+        [
+            ImageTask(
+                content_type=ContentType.objects.get_for_model(instance),
+                object_id=instance.pk,
+                field_name=field_name,
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=["content_type", "object_id", "field_name"],
+        update_fields=["attempts", "locked_until"],
+    )
+
+
+def claim_next_task():
+    """Взять задачу на IMAGE_PROCESSING_LEASE секунд.
+
+    Блокировка строки держится только здесь, а не всё время обработки;
+    задачу упавшего воркера после истечения срока возьмёт другой.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        task = (
+            ImageTask.objects.select_for_update(skip_locked=True)
+            .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+            .order_by("created_at")
+            .first()
+        )
+        if task is not None:
+            task.locked_until = now + timedelta(
+                seconds=settings.IMAGE_PROCESSING_LEASE
+            )
+            task.save(update_fields=["locked_until"])
+    return task
+
+
+def process_next_task():
+    """Обработать одну задачу из очереди. False, если очередь пуста.
+
+    Pillow работает вне транзакции. Задача меняется только пока она
+    взята этим воркером: новая загрузка сбрасывает locked_until, и
+    тогда задача остаётся в очереди для новой картинки.
+    """
+    task = claim_next_task()
+    if task is None:
+        return False
+    claimed = ImageTask.objects.filter(
+        pk=task.pk, locked_until=task.locked_until
+    )
+    instance = task.target
+    field_file = getattr(instance, task.field_name, None)
+    if not field_file:
+        claimed.delete()
+        return True
+    try:
+        rendered = render_image(field_file)
+    except Exception:
+        attempts = task.attempts + 1
+        if attempts < settings.IMAGE_PROCESSING_MAX_ATTEMPTS:
+            claimed.update(attempts=attempts, locked_until=None)
+            return True
+        with transaction.atomic():
+            if type(instance).objects.filter(
+                pk=instance.pk, **{task.field_name: field_file.name}
+            ).select_for_update().exists():
+                set_image_status(instance, task.field_name, ImageStatus.FAILED)
+                claimed.delete()
+        return True
+    with transaction.atomic():
+        variants = store_image(field_file, rendered)
+        if variants is not None:
+            store_variants(instance, task.field_name, variants)
+            set_image_status(instance, task.field_name, ImageStatus.READY)
+            claimed.delete()
+    return True
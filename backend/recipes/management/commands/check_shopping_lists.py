@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare stored shopping lists with totals recalculated "
+        "from shopping baskets"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rebuild shopping lists of users with mismatches",
+        )
+
+    def handle(self, *args, **options):
+        expected = ShoppingListItem.objects.expected_totals()
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in (
+                ShoppingListItem.objects.values_list(
+                    "user_id", "ingredient_id", "total_amount"
+                )
+            )
+        }
+        mismatches = sorted(
+            (key, stored.get(key), expected.get(key))
+            for key in stored.keys() | expected.keys()
+            if stored.get(key) != expected.get(key)
+        )
+        for (user_id, ingredient_id), actual, total in mismatches:
+            self.stdout.write(
+                f"user={user_id} ingredient={ingredient_id}: "
+                f"stored {actual}, expected {total}"
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Shopping lists are in sync"))
+            return
+        if not options["fix"]:
+            raise CommandError(
+                f"Found {len(mismatches)} mismatched shopping list rows"
+            )
+        user_ids = {user_id for (user_id, _), _, _ in mismatches}
+        ShoppingListItem.objects.rebuild(user_ids)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt shopping lists for {len(user_ids)} users"
+            )
+        )
@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.feed import process_next_task
+
+
+class Command(BaseCommand):
+    help = "Fan out new recipes to the feeds of their authors' followers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=2, help="Worker threads"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue and exit",
+        )
+
+    def drain(self):
+        processed = 0
+        try:
+            while process_next_task():
+                processed += 1
+        finally:
+            connection.close()
+        return processed
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                processed = sum(
+                    pool.map(lambda _: self.drain(), range(workers))
+                )
+                if processed:
+                    self.stdout.write(f"Fanned out {processed} recipes")
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
@@ -1,41 +1,81 @@
 import csv
-import os
+import json
+import time
+from pathlib import Path
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from recipes.models import Ingredient
 
+DEFAULT_FILE = settings.BASE_DIR.parent / "data" / "ingredients.csv"
+BATCH_SIZE = 1000
+
+
+def read_csv(path):
+    with open(path, "r", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, "r", encoding="utf-8") as file:
+        for item in json.load(file):
+            yield item["name"], item["measurement_unit"]
+
 
 class Command(BaseCommand):
-    help = "Load ingredients from CSV file"
+    help = "Load ingredients from CSV or JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=DEFAULT_FILE,
+            help="CSV (name,unit) or JSON file, data/ingredients.csv "
+            "by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Rows per INSERT statement",
+        )
 
     def handle(self, *args, **options):
-        csv_file = "../data/ingredients.csv"
+        path = Path(options["path"])
 
-        if not os.path.exists(csv_file):
-            self.stdout.write(self.style.ERROR(f"File {csv_file} not found"))
+        if not path.exists():
+            self.stdout.write(self.style.ERROR(f"File {path} not found"))
             return
 
-        with open(csv_file, "r", encoding="utf-8") as file:
-            reader = csv.reader(file)
-            ingredients_created = 0
-
-            for row in reader:
-                if len(row) >= 2:
-                    name = row[0].strip()
-                    measurement_unit = row[1].strip()
-
-                    ingredient, created = Ingredient.objects.get_or_create(
-                        name=name, measurement_unit=measurement_unit
-                    )
-                    if created:
-                        ingredients_created += 1
-                        self.stdout.write(
-                            f"Created: {name} - {measurement_unit}"
-                        )
-
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Successfully loaded {ingredients_created} ingredients"
-                )
+        started = time.monotonic()
+        reader = read_json if path.suffix == ".json" else read_csv
+        rows = {
+            (name.strip(), measurement_unit.strip())
+            for name, measurement_unit in reader(path)
+        }
+
+        with transaction.atomic():
+            existing = set(
+                Ingredient.objects.values_list("name", "measurement_unit")
+            )
+            new_rows = rows - existing
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in sorted(new_rows)
+                ),
+                batch_size=options["batch_size"],
+                ignore_conflicts=True,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully loaded {len(new_rows)} ingredients "
+                f"({len(rows) - len(new_rows)} already existed) "
+                f"in {time.monotonic() - started:.2f}s"
             )
+        )
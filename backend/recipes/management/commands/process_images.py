@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.images import enqueue_image, process_next_task
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Process queued image uploads (resize, strip EXIF, validate)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=2, help="Worker threads"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue and exit",
+        )
+        parser.add_argument(
+            "--missing-variants",
+            action="store_true",
+            help="Queue existing images that have no sized variants yet",
+        )
+
+    def enqueue_missing_variants(self):
+        queued = 0
+        for model, field_name in ((Recipe, "image"), (User, "avatar")):
+            instances = (
+                model.objects.exclude(**{field_name: ""})
+                .exclude(**{f"{field_name}__isnull": True})
+                .filter(**{f"{field_name}_variants": {}})
+            )
+            for instance in instances.iterator():
+                enqueue_image(instance, field_name)
+                queued += 1
+        self.stdout.write(f"Queued {queued} images")
+
+    def drain(self):
+        processed = 0
+        try:
+            while process_next_task():
+                processed += 1
+        finally:
+            connection.close()
+        return processed
+
+    def handle(self, *args, **options):
+        if options["missing_variants"]:
+            self.enqueue_missing_variants()
+        workers = options["workers"]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                processed = sum(
+                    pool.map(lambda _: self.drain(), range(workers))
+                )
+                if processed:
+                    self.stdout.write(f"Processed {processed} images")
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
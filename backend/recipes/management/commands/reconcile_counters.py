@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe
+from users.models import Follow
+
+User = get_user_model()
+
+
+def count_of(model, field):
+    """Количество строк model, ссылающихся на внешнюю строку через field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "followers_count", Follow, "author"),
+)
+
+
+class Command(BaseCommand):
+    help = "Recalculate denormalized favorites, recipes and followers counters"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model, counter, related_model, field in COUNTERS:
+                actual = count_of(related_model, field)
+                fixed = (
+                    model.objects.exclude(**{counter: actual})
+                    .order_by()
+                    .update(**{counter: actual})
+                )
+                self.stdout.write(
+                    f"{model._meta.model_name}.{counter}: fixed {fixed} rows"
+                )
+        self.stdout.write(self.style.SUCCESS("Counters are reconciled"))
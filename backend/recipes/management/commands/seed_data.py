@@ -0,0 +1,361 @@
+import io
+import random
+import time
+from array import array
+from datetime import timedelta
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import (
+    DateTimeField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    Value,
+    Window,
+)
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import (
+    Favorite,
+    FeedItem,
+    Ingredient,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingBasket,
+    ShoppingListItem,
+    Tag,
+)
+from recipes.search import update_search_vectors
+from users.models import Follow
+
+User = get_user_model()
+
+IMAGE_NAME = "recipes/images/seed.jpg"
+TAGS = (
+    ("Завтрак", "breakfast"),
+    ("Обед", "lunch"),
+    ("Ужин", "dinner"),
+    ("Выпечка", "baking"),
+    ("Десерт", "dessert"),
+    ("Постное", "lenten"),
+)
+DISHES = (
+    "суп салат пирог рагу запеканка каша омлет плов паста котлеты блины "
+    "торт соус жаркое"
+).split()
+ADJECTIVES = (
+    "домашний быстрый праздничный летний острый сытный лёгкий бабушкин "
+    "простой нежный"
+).split()
+STEPS = (
+    "нарезать обжарить отварить смешать запечь посолить поперчить "
+    "остудить подавать тушить"
+).split()
+
+
+def skewed(rng, size, skew):
+    """Индекс от 0 до size - 1, малые индексы выпадают чаще.
+
+    P(индекс < k) = (k / size) ** (1 / skew): при skew=3 на первый
+    процент объектов приходится пятая часть выборки.
+    """
+    return int(size * rng.random() ** skew)
+
+
+def batched(objects, size):
+    objects = iter(objects)
+    while batch := list(islice(objects, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with reproducible synthetic users, recipes, "
+        "favorites, baskets and follows for load testing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipes", type=int, default=10000, help="Recipes to create"
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            help="Users to create, recipes / 10 by default",
+        )
+        parser.add_argument(
+            "--favorites",
+            type=int,
+            help="Favorites to create, recipes * 2 by default",
+        )
+        parser.add_argument(
+            "--baskets",
+            type=int,
+            help="Shopping basket rows to create, users * 3 by default",
+        )
+        parser.add_argument(
+            "--follows",
+            type=int,
+            help="Follows to create, users * 5 by default",
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=3.0,
+            help="Power-law skew of authors, recipes and followed users",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Spread recipe publication dates over this many days",
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="Password of the created users",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows per INSERT statement",
+        )
+
+    def stage(self, title, started):
+        self.stdout.write(f"{title} in {time.monotonic() - started:.1f}s")
+        return time.monotonic()
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.skew = options["skew"]
+        self.batch_size = options["batch_size"]
+        n_recipes = options["recipes"]
+        n_users = options["users"] or max(n_recipes // 10, 2)
+        n_favorites = options["favorites"]
+        n_baskets = options["baskets"]
+        n_follows = options["follows"]
+
+        started = time.monotonic()
+        ingredient_ids = list(Ingredient.objects.values_list("id", flat=True))
+        if not ingredient_ids:
+            call_command("load_ingredients", stdout=io.StringIO())
+            ingredient_ids = list(
+                Ingredient.objects.values_list("id", flat=True)
+            )
+        if not ingredient_ids:
+            raise CommandError("No ingredients, run load_ingredients first")
+        self.rng.shuffle(ingredient_ids)
+        for name, slug in TAGS:
+            Tag.objects.get_or_create(slug=slug, defaults={"name": name})
+        tag_ids = list(Tag.objects.values_list("id", flat=True))
+        if not default_storage.exists(IMAGE_NAME):
+            image = io.BytesIO()
+            Image.new("RGB", (480, 320), (200, 120, 60)).save(image, "JPEG")
+            default_storage.save(IMAGE_NAME, ContentFile(image.getvalue()))
+
+        user_ids = self.create_users(n_users, options["password"])
+        started = self.stage(f"Created {len(user_ids)} users", started)
+        recipe_ids = self.create_recipes(
+            n_recipes, user_ids, ingredient_ids, tag_ids, options["days"]
+        )
+        started = self.stage(f"Created {len(recipe_ids)} recipes", started)
+
+        self.insert(
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in self.pairs(
+                user_ids,
+                recipe_ids,
+                n_recipes * 2 if n_favorites is None else n_favorites,
+            )
+        )
+        self.insert(
+            ShoppingBasket(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in self.pairs(
+                user_ids,
+                recipe_ids,
+                n_users * 3 if n_baskets is None else n_baskets,
+            )
+        )
+        self.insert(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in self.pairs(
+                user_ids,
+                user_ids,
+                n_users * 5 if n_follows is None else n_follows,
+            )
+            if user_id != author_id
+        )
+        started = self.stage("Created favorites, baskets and follows", started)
+
+        call_command("reconcile_counters", stdout=io.StringIO())
+        for chunk in batched(user_ids, self.batch_size):
+            ShoppingListItem.objects.rebuild(chunk)
+        self.fill_feeds()
+        for chunk in batched(recipe_ids, self.batch_size):
+            update_search_vectors(
+                Recipe.objects.filter(pk__gte=chunk[0], pk__lte=chunk[-1])
+            )
+        self.stage("Updated counters, shopping lists, feeds, search", started)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Database has {User.objects.count()} users, "
+                f"{Recipe.objects.count()} recipes, "
+                f"{Favorite.objects.count()} favorites, "
+                f"{ShoppingBasket.objects.count()} basket rows, "
+                f"{Follow.objects.count()} follows"
+            )
+        )
+
+    def create_users(self, count, password):
+        password = make_password(password)
+        start = User.objects.count()
+        user_ids = array("q")
+        for chunk in batched(range(start, start + count), self.batch_size):
+            users = User.objects.bulk_create(
+                User(
+                    email=f"user{number}@example.com",
+                    username=f"user{number}",
+                    first_name="Пользователь",
+                    last_name=str(number),
+                    password=password,
+                )
+                for number in chunk
+            )
+            user_ids.extend(user.pk for user in users)
+        return user_ids
+
+    def create_recipes(self, count, user_ids, ingredient_ids, tag_ids, days):
+        rng = self.rng
+        recipe_ids = array("q")
+        for chunk in batched(range(count), self.batch_size):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(
+                    author_id=user_ids[
+                        skewed(rng, len(user_ids), self.skew)
+                    ],
+                    name=(
+                        f"{rng.choice(ADJECTIVES).capitalize()} "
+                        f"{rng.choice(DISHES)} №{number}"
+                    ),
+                    text=" ".join(rng.choices(STEPS, k=rng.randint(5, 30))),
+                    image=IMAGE_NAME,
+                    cooking_time=rng.randint(5, 180),
+                )
+                for number in chunk
+            )
+            amounts = []
+            tags = []
+            for recipe in recipes:
+                ingredients = {
+                    ingredient_ids[
+                        skewed(rng, len(ingredient_ids), self.skew)
+                    ]
+                    for _ in range(rng.randint(3, 10))
+                }
+                amounts.extend(
+                    IngredientsInRecipe(
+                        recipe_id=recipe.pk,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500),
+                    )
+                    for ingredient_id in ingredients
+                )
+                tags.extend(
+                    Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                    for tag_id in rng.sample(tag_ids, rng.randint(1, 3))
+                )
+                recipe_ids.append(recipe.pk)
+            IngredientsInRecipe.objects.bulk_create(amounts)
+            Recipe.tags.through.objects.bulk_create(tags)
+        if recipe_ids:
+            # pub_date с auto_now_add, поэтому даты расставляются после
+            # вставки: чем больше id, тем новее рецепт.
+            step = timedelta(days=days) / len(recipe_ids)
+            Recipe.objects.filter(pk__gte=recipe_ids[0]).update(
+                pub_date=ExpressionWrapper(
+                    Value(timezone.now() - timedelta(days=days))
+                    + (F("pk") - recipe_ids[0])
+                    * Value(step, output_field=DurationField()),
+                    output_field=DateTimeField(),
+                )
+            )
+        return recipe_ids
+
+    def pairs(self, user_ids, target_ids, count):
+        """Пары (пользователь, объект): популярные объекты чаще."""
+        rng = self.rng
+        for _ in range(count):
+            yield (
+                user_ids[rng.randrange(len(user_ids))],
+                target_ids[skewed(rng, len(target_ids), self.skew)],
+            )
+
+    def insert(self, objects):
+        """bulk_create пачками: bulk_create сам собирает всё в список."""
+        for batch in batched(objects, self.batch_size):
+            type(batch[0]).objects.bulk_create(batch, ignore_conflicts=True)
+
+    def fill_feeds(self):
+        """Ленты для подписок: при вставке сигналы не вызывались.
+
+        Как и backfill_feed, в ленту попадают последние
+        FEED_BACKFILL_SIZE рецептов автора. Подписки и рецепты читаются
+        потоками, упорядоченными по автору, и соединяются слиянием.
+        """
+        recent = (
+            Recipe.objects.filter(
+                author__followers_count__lte=(
+                    settings.FEED_FAN_OUT_MAX_FOLLOWERS
+                )
+            )
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=F("pub_date").desc(),
+                )
+            )
+            .filter(position__lte=settings.FEED_BACKFILL_SIZE)
+            .order_by("author_id")
+            .values_list("author_id", "id", "pub_date")
+        )
+        follows = Follow.objects.order_by("author_id").values_list(
+            "author_id", "user_id"
+        )
+        self.insert(
+            FeedItem(user_id=user_id, recipe_id=recipe_id, pub_date=date)
+            for user_id, rows in self.merge_by_author(
+                follows.iterator(chunk_size=self.batch_size),
+                recent.iterator(chunk_size=self.batch_size),
+            )
+            for recipe_id, date in rows
+        )
+
+    @staticmethod
+    def merge_by_author(follows, recipes):
+        """Пары (подписчик, рецепты автора) из двух потоков по author_id."""
+        recipes_by_author = groupby(recipes, key=itemgetter(0))
+        current = next(recipes_by_author, None)
+        for author_id, followers in groupby(follows, key=itemgetter(0)):
+            while current is not None and current[0] < author_id:
+                current = next(recipes_by_author, None)
+            if current is None:
+                return
+            if current[0] != author_id:
+                continue
+            rows = [(recipe_id, date) for _, recipe_id, date in current[1]]
+            current = next(recipes_by_author, None)
+            for _, user_id in followers:
+                yield user_id, rows
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:03
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_rows(model, owner, amount, kept_id, duplicate_ids):
+    """Перевесить строки на kept_id, сложив количества при совпадении."""
+    for row in model.objects.filter(ingredient_id__in=duplicate_ids):
+        owner_id = getattr(row, f"{owner}_id")
+        target = model.objects.filter(
+            **{f"{owner}_id": owner_id}, ingredient_id=kept_id
+        ).first()
+        if target is None:
+            row.ingredient_id = kept_id
+            row.save(update_fields=["ingredient"])
+            continue
+        setattr(target, amount, getattr(target, amount) + getattr(row, amount))
+        target.save(update_fields=[amount])
+        row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Слить одинаковые ингредиенты в строку с наименьшим id.
+
+    Дубли могли появиться из админки или прежних запусков
+    load_ingredients; без этого ограничение не создаётся.
+    """
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    IngredientsInRecipe = apps.get_model("recipes", "IngredientsInRecipe")
+    ShoppingListItem = apps.get_model("recipes", "ShoppingListItem")
+    groups = (
+        Ingredient.objects.order_by()
+        .values("name", "measurement_unit")
+        .annotate(kept_id=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for group in groups:
+        duplicate_ids = list(
+            Ingredient.objects.filter(
+                name=group["name"],
+                measurement_unit=group["measurement_unit"],
+            )
+            .exclude(pk=group["kept_id"])
+            .values_list("id", flat=True)
+        )
+        merge_rows(
+            IngredientsInRecipe,
+            "recipe",
+            "amount",
+            group["kept_id"],
+            duplicate_ids,
+        )
+        merge_rows(
+            ShoppingListItem,
+            "user",
+            "total_amount",
+            group["kept_id"],
+            duplicate_ids,
+        )
+        Ingredient.objects.filter(pk__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    # Слияние фиксируется отдельно: в той же транзакции PostgreSQL не
+    # даёт менять таблицу с отложенными проверками внешних ключей.
+    atomic = False
+
+    dependencies = [
+        ("recipes", "0002_shoppinglistitem"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients,
+            migrations.RunPython.noop,
+            atomic=True,
+        ),
+        migrations.AddConstraint(
+            model_name="ingredient",
+            constraint=models.UniqueConstraint(
+                fields=("name", "measurement_unit"), name="unique_ingredient"
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:04
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0003_ingredient_unique_ingredient"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=models.Index(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Lower("name"),
+                    name="varchar_pattern_ops",
+                ),
+                name="ingredient_lower_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ingredient",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Lower("name"),
+                    name="gin_trgm_ops",
+                ),
+                name="ingredient_lower_name_trgm_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0004_ingredient_name_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="favorite",
+            name="unique_favorite",
+        ),
+        migrations.RemoveConstraint(
+            model_name="shoppingbasket",
+            name="unique_shopping_cart",
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["-pub_date"], name="recipe_pub_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["author", "-pub_date"],
+                name="recipe_author_pub_date_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="favorite",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"),
+                include=("added_at",),
+                name="unique_favorite",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="shoppingbasket",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"),
+                include=("added_at",),
+                name="unique_shopping_cart",
+            ),
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.6 on 2026-10-17 06:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+
+def fill_feeds(apps, schema_editor):
+    """Как backfill_feed: последние FEED_BACKFILL_SIZE рецептов автора."""
+    Recipe = apps.get_model("recipes", "Recipe")
+    FeedItem = apps.get_model("recipes", "FeedItem")
+    recent = (
+        Recipe.objects.filter(
+            author__followers_count__lte=settings.FEED_FAN_OUT_MAX_FOLLOWERS
+        )
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F("author"),
+                order_by=F("pub_date").desc(),
+            )
+        )
+        .filter(position__lte=settings.FEED_BACKFILL_SIZE)
+        .values("pk")
+    )
+    rows = Recipe.objects.filter(
+        pk__in=recent, author__following__isnull=False
+    ).values_list("author__following__user", "id", "pub_date")
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id, recipe_id, pub_date in rows.iterator()
+        ),
+        batch_size=settings.FEED_FAN_OUT_BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0008_recipe_image_variants"),
+        ("users", "0005_user_avatar_variants"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedTask",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_task",
+                        to="recipes.recipe",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Рассылка в ленты",
+                "verbose_name_plural": "Очередь рассылки в ленты",
+                "ordering": ["created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="FeedItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("pub_date", models.DateTimeField(verbose_name="Дата публикации")),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_items",
+                        to="recipes.recipe",
+                        verbose_name="Рецепт",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feed_items",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Подписчик",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запись ленты",
+                "verbose_name_plural": "Ленты подписок",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-pub_date", "-recipe"],
+                        name="feed_item_user_pub_date_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "recipe"), name="unique_feed_item"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0011_recipe_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="imagetask",
+            name="locked_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,12 +1,24 @@
 from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Lower
 
 MAX_LENGTH = 150
 
 User = get_user_model()
 
 
+class ImageStatus(models.TextChoices):
+    PENDING = "pending", "Обрабатывается"
+    READY = "ready", "Готово"
+    FAILED = "failed", "Ошибка"
+
+
 class Tag(models.Model):
     """Модель тега рецепта."""
 
@@ -40,6 +52,22 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "measurement_unit"],
+                name="unique_ingredient",
+            )
+        ]
+        indexes = [
+            models.Index(
+                OpClass(Lower("name"), name="varchar_pattern_ops"),
+                name="ingredient_lower_name_idx",
+            ),
+            GinIndex(
+                OpClass(Lower("name"), name="gin_trgm_ops"),
+                name="ingredient_lower_name_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -72,6 +100,12 @@ class IngredientsInRecipe(models.Model):
         return f"{self.ingredient} в {self.recipe}"
 
 
+class RecipeQuerySet(models.QuerySet):
+    def expire_documents(self):
+        """Сменить версию рецептов: их документы в кеше API устаревают."""
+        return self.update(version=F("version") + 1)
+
+
 class Recipe(models.Model):
     """Модель рецептов."""
 
@@ -83,6 +117,18 @@ class Recipe(models.Model):
     )
     name = models.CharField(max_length=MAX_LENGTH)
     image = models.ImageField(upload_to="recipes/images", verbose_name="Фото")
+    image_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        verbose_name="Статус обработки фото",
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Размеры фото",
+    )
     text = models.TextField(verbose_name="Оисание рецепта")
     tags = models.ManyToManyField(
         Tag, related_name="recipes", verbose_name="Теги"
@@ -101,11 +147,30 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name="Дата публикации"
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name="В избранном"
+    )
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name="Поисковый вектор"
+    )
+    version = models.PositiveIntegerField(
+        default=1, editable=False, verbose_name="Версия"
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            models.Index(fields=["-pub_date"], name="recipe_pub_date_idx"),
+            models.Index(
+                fields=["author", "-pub_date"],
+                name="recipe_author_pub_date_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="recipe_search_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -137,7 +202,9 @@ class Favorite(models.Model):
 
         constraints = [
             models.UniqueConstraint(
-                fields=["user", "recipe"], name="unique_favorite"
+                fields=["user", "recipe"],
+                name="unique_favorite",
+                include=["added_at"],
             )
         ]
 
@@ -168,9 +235,256 @@ class ShoppingBasket(models.Model):
         verbose_name_plural = "Корзины покупок"
         constraints = [
             models.UniqueConstraint(
-                fields=["user", "recipe"], name="unique_shopping_cart"
+                fields=["user", "recipe"],
+                name="unique_shopping_cart",
+                include=["added_at"],
             )
         ]
 
     def __str__(self):
         return f"{self.user.username} -> {self.recipe.name} (корзина)"
+
+
+class ShoppingListItemManager(models.Manager):
+    """Инкрементальное обновление сумм ингредиентов в списках покупок."""
+
+    @staticmethod
+    def recipe_amounts(recipe):
+        """Количество каждого ингредиента рецепта: {ingredient_id: amount}."""
+        return dict(
+            IngredientsInRecipe.objects.filter(recipe=recipe).values_list(
+                "ingredient_id", "amount"
+            )
+        )
+
+    def expected_totals(self, user_ids=None):
+        """Суммы, посчитанные заново по корзинам: {(user, ingr): total}."""
+        condition = Q(recipe__in_shopping_basket__isnull=False)
+        if user_ids is not None:
+            condition &= Q(recipe__in_shopping_basket__user__in=user_ids)
+        rows = (
+            IngredientsInRecipe.objects.filter(condition)
+            .values_list("recipe__in_shopping_basket__user", "ingredient")
+            .annotate(total_amount=Sum("amount"))
+        )
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows
+        }
+
+    @transaction.atomic(savepoint=False)
+    def apply_amounts(self, user_ids, amounts, sign=1):
+        """Прибавить (sign=1) или вычесть (sign=-1) количества ингредиентов.
+
+        Для каждого пользователя из user_ids меняются суммы ингредиентов
+        из amounts ({ingredient_id: amount}). Строки с нулевой суммой
+        удаляются. Пользователи блокируются, чтобы параллельные
+        изменения одного списка не терялись.
+        """
+        amounts = {key: value for key, value in amounts.items() if value}
+        if not amounts:
+            return
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        list(
+            User.objects.select_for_update()
+            .filter(id__in=user_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        existing = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.filter(
+                user__in=user_ids, ingredient__in=amounts
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, amount in amounts.items():
+                item = existing.get((user_id, ingredient_id))
+                if item is None:
+                    if sign * amount > 0:
+                        to_create.append(
+                            self.model(
+                                user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                total_amount=sign * amount,
+                            )
+                        )
+                    continue
+                item.total_amount += sign * amount
+                if item.total_amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.id)
+        self.bulk_create(to_create)
+        self.bulk_update(to_update, ["total_amount"])
+        self.filter(id__in=to_delete).delete()
+
+    def add_recipe(self, user, recipe):
+        """Рецепт добавлен в корзину."""
+        self.apply_amounts([user.id], self.recipe_amounts(recipe))
+
+    def remove_recipe(self, user, recipe):
+        """Рецепт убран из корзины."""
+        self.apply_amounts([user.id], self.recipe_amounts(recipe), sign=-1)
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Состав рецепта изменился: применяем разницу ко всем корзинам."""
+        delta = {
+            ingredient_id: new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        user_ids = ShoppingBasket.objects.filter(recipe=recipe).values_list(
+            "user_id", flat=True
+        )
+        self.apply_amounts(user_ids, delta)
+
+    @transaction.atomic
+    def rebuild(self, user_ids=None):
+        """Пересобрать списки покупок по корзинам."""
+        items = self.all()
+        if user_ids is not None:
+            items = items.filter(user__in=user_ids)
+        items.delete()
+        self.bulk_create(
+            self.model(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=total,
+            )
+            for (user_id, ingredient_id), total in self.expected_totals(
+                user_ids
+            ).items()
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента в списке покупок пользователя.
+
+    Поддерживается при изменении корзины и состава рецептов, чтобы
+    скачивание списка покупок было простым чтением.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Ингредиент",
+    )
+    total_amount = models.PositiveIntegerField(verbose_name="Количество")
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Списки покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"], name="unique_shopping_list_item"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} -> {self.ingredient} ({self.total_amount})"
+
+
+class ImageTask(models.Model):
+    """Отложенная обработка загруженного изображения.
+
+    Задачи выполняет команда process_images: проверяет картинку,
+    уменьшает её, убирает EXIF и выставляет <поле>_status объекта.
+    """
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    field_name = models.CharField(max_length=50)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # До этого момента задачу обрабатывает взявший её воркер.
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    target = GenericForeignKey("content_type", "object_id")
+
+    class Meta:
+        ordering = ["created_at"]
+        verbose_name = "Обработка изображения"
+        verbose_name_plural = "Очередь обработки изображений"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "object_id", "field_name"],
+                name="unique_image_task",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.content_type} {self.object_id}.{self.field_name}"
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписчика (fan-out on write).
+
+    pub_date копируется из рецепта, чтобы лента читалась одним
+    проходом по индексу (user, -pub_date, -recipe) без соединений.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_items",
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="feed_items",
+        verbose_name="Рецепт",
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Ленты подписок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"], name="unique_feed_item"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-recipe"],
+                name="feed_item_user_pub_date_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} <- {self.recipe}"
+
+
+class FeedTask(models.Model):
+    """Отложенная рассылка нового рецепта по лентам подписчиков.
+
+    Задачи выполняет команда fan_out_feed.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, related_name="feed_task"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        verbose_name = "Рассылка в ленты"
+        verbose_name_plural = "Очередь рассылки в ленты"
+
+    def __str__(self):
+        return str(self.recipe)
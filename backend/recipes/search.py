@@ -0,0 +1,59 @@
+"""Полнотекстовый поиск рецептов.
+
+Название, ингредиенты и описание хранятся в Recipe.search_vector с весами
+A, B и C. Колонку обновляет update_search_vectors после записи рецепта
+и его ингредиентов, поиск идёт по GIN-индексу.
+"""
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import models
+from django.db.models import F, OuterRef, Subquery
+
+from recipes.models import IngredientsInRecipe, Recipe
+
+
+def build_search_vector():
+    ingredient_names = (
+        IngredientsInRecipe.objects.filter(recipe=OuterRef("pk"))
+        .values("recipe")
+        .annotate(names=StringAgg("ingredient__name", " "))
+        .values("names")
+    )
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (
+        SearchVector("name", config=config, weight="A")
+        + SearchVector(Subquery(ingredient_names), config=config, weight="B")
+        + SearchVector("text", config=config, weight="C")
+    )
+
+
+def update_search_vectors(recipes):
+    """Пересчитать search_vector одним UPDATE.
+
+    recipes — queryset рецептов или список их id.
+    """
+    if not isinstance(recipes, models.QuerySet):
+        recipes = Recipe.objects.filter(pk__in=recipes)
+    recipes.update(search_vector=build_search_vector())
+
+
+def search_recipes(queryset, value):
+    """Рецепты по запросу в синтаксисе websearch, лучшие первыми.
+
+    Совпадения находит GIN-индекс, ts_rank считается по всем им: более
+    старый, но более подходящий рецепт не пропадает из выдачи.
+    """
+    query = SearchQuery(
+        value, config=settings.RECIPE_SEARCH_CONFIG, search_type="websearch"
+    )
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(search_rank=SearchRank(F("search_vector"), query))
+        .order_by("-search_rank", "-pub_date", "-id")
+    )
@@ -0,0 +1,168 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from recipes.autocomplete import ingredient_index
+from recipes.feed import backfill_feed
+from recipes.images import image_updated
+from recipes.models import (
+    Favorite,
+    FeedItem,
+    Ingredient,
+    Recipe,
+    ShoppingListItem,
+    Tag,
+)
+from recipes.search import update_search_vectors
+from users.models import Follow
+
+User = get_user_model()
+
+# Поля пользователя, которые попадают в документ рецепта (author).
+AUTHOR_FIELDS = frozenset(
+    ("email", "username", "first_name", "last_name", "avatar")
+)
+
+# Денормализованные счётчики (см. reconcile_counters): поле-ссылка
+# строки и счётчик строки, на которую она ссылается.
+COUNTERS = {
+    Favorite: ("recipe", "favorites_count"),
+    Recipe: ("author", "recipes_count"),
+    Follow: ("author", "followers_count"),
+}
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбросить индекс автодополнения при изменении ингредиентов."""
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_recipes_search(sender, instance, created, **kwargs):
+    """Переименование ингредиента меняет поисковый вектор рецептов."""
+    if not created:
+        update_search_vectors(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Follow)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    """Новая подписка: последние рецепты автора попадают в ленту."""
+    if created:
+        backfill_feed(instance.user_id, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_feed(sender, instance, **kwargs):
+    """Отписка: рецепты автора убираются из ленты."""
+    FeedItem.objects.filter(
+        user_id=instance.user_id, recipe__author_id=instance.author_id
+    ).delete()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+def expire_documents_on_rename(sender, instance, created, **kwargs):
+    """Рецепты с изменённым тегом или ингредиентом получают новую версию."""
+    if not created:
+        instance.recipes.all().expire_documents()
+
+
+@receiver(pre_delete, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+def expire_documents_on_delete(sender, instance, **kwargs):
+    """Версия меняется до удаления: после него связей с рецептами нет."""
+    instance.recipes.all().expire_documents()
+
+
+@receiver(post_save, sender=User)
+def expire_author_documents(
+    sender, instance, created, update_fields, **kwargs
+):
+    """Правка профиля меняет документы всех рецептов автора.
+
+    Сохранения без этих полей (last_login при входе) рецепты не трогают.
+    """
+    if created or (
+        update_fields is not None and not AUTHOR_FIELDS & update_fields
+    ):
+        return
+    Recipe.objects.filter(author=instance).expire_documents()
+
+
+@receiver(image_updated, sender=Recipe)
+def expire_recipe_document(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.pk).expire_documents()
+
+
+@receiver(image_updated, sender=User)
+def expire_avatar_documents(sender, instance, **kwargs):
+    Recipe.objects.filter(author=instance).expire_documents()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_shopping_lists(sender, instance, **kwargs):
+    """Удалённый рецепт (API, админка, удаление автора) уходит из списков.
+
+    pre_delete: корзины с рецептом ещё не удалены каскадом.
+    """
+    ShoppingListItem.objects.change_recipe(
+        instance, ShoppingListItem.objects.recipe_amounts(instance), {}
+    )
+
+
+def change_counter(sender, target_id, delta):
+    field_name, counter = COUNTERS[sender]
+    target = sender._meta.get_field(field_name).related_model
+    target.objects.filter(pk=target_id).update(
+        **{counter: F(counter) + delta}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follow)
+def increment_counter(sender, instance, created, raw, **kwargs):
+    """Новая строка из API, админки или shell увеличивает счётчик."""
+    if created and not raw:
+        field_name, _ = COUNTERS[sender]
+        change_counter(sender, getattr(instance, f"{field_name}_id"), 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follow)
+def decrement_counter(sender, instance, **kwargs):
+    """Удаление, в том числе каскадом от пользователя или рецепта."""
+    field_name, _ = COUNTERS[sender]
+    change_counter(sender, getattr(instance, f"{field_name}_id"), -1)
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Follow)
+def move_counter(sender, instance, raw, update_fields, **kwargs):
+    """Строку перевесили на другой рецепт или автора (админка)."""
+    field_name, _ = COUNTERS[sender]
+    if (
+        raw
+        or instance._state.adding
+        or (update_fields is not None and field_name not in update_fields)
+    ):
+        return
+    attname = f"{field_name}_id"
+    old_id = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list(attname, flat=True)
+        .first()
+    )
+    new_id = getattr(instance, attname)
+    if old_id is not None and old_id != new_id:
+        change_counter(sender, old_id, -1)
+        change_counter(sender, new_id, 1)
@@ -0,0 +1,143 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientsInRecipe,
+    Recipe,
+    ShoppingBasket,
+    ShoppingListItem,
+)
+from users.models import Follow
+
+User = get_user_model()
+
+
+class ShoppingBasketAdminTest(TestCase):
+    """Правка корзин в админке обновляет списки покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com",
+            username="admin",
+            first_name="Админ",
+            last_name="Сайта",
+            password="password",
+        )
+        cls.reader = User.objects.create_user(
+            email="reader@example.com",
+            username="reader",
+            first_name="Читатель",
+            last_name="Рецептов",
+            password="password",
+        )
+        ingredient = Ingredient.objects.create(
+            name="Мука", measurement_unit="г"
+        )
+        cls.ingredient = ingredient
+        cls.recipes = []
+        for amount in (100, 250):
+            recipe = Recipe.objects.create(
+                author=cls.admin,
+                name=f"Рецепт {amount}",
+                text="Приготовить",
+                cooking_time=5,
+                image="recipes/images/recipe.png",
+            )
+            IngredientsInRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def total(self):
+        item = ShoppingListItem.objects.filter(
+            user=self.reader, ingredient=self.ingredient
+        ).first()
+        return item.total_amount if item else None
+
+    def basket_form(self, recipe):
+        return {"user": self.reader.pk, "recipe": recipe.pk}
+
+    def test_add_change_delete(self):
+        response = self.client.post(
+            "/admin/recipes/shoppingbasket/add/",
+            self.basket_form(self.recipes[0]),
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.total(), 100)
+        basket = ShoppingBasket.objects.get(user=self.reader)
+        response = self.client.post(
+            f"/admin/recipes/shoppingbasket/{basket.pk}/change/",
+            self.basket_form(self.recipes[1]),
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.total(), 250)
+        response = self.client.post(
+            f"/admin/recipes/shoppingbasket/{basket.pk}/delete/",
+            {"post": "yes"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNone(self.total())
+
+    def test_delete_selected(self):
+        for recipe in self.recipes:
+            ShoppingBasket.objects.create(user=self.reader, recipe=recipe)
+        ShoppingListItem.objects.rebuild([self.reader.pk])
+        self.assertEqual(self.total(), 350)
+        response = self.client.post(
+            "/admin/recipes/shoppingbasket/",
+            {
+                "action": "delete_selected",
+                "_selected_action": ShoppingBasket.objects.values_list(
+                    "pk", flat=True
+                ),
+                "post": "yes",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNone(self.total())
+
+
+class CountersTest(TestCase):
+    """Счётчики меняются при любом удалении, не только через API."""
+
+    def create_user(self, name):
+        return User.objects.create_user(
+            email=f"{name}@example.com",
+            username=name,
+            first_name="Имя",
+            last_name="Фамилия",
+            password="password",
+        )
+
+    def test_cascade_from_user(self):
+        author = self.create_user("author")
+        reader = self.create_user("reader")
+        recipe = Recipe.objects.create(
+            author=author,
+            name="Суп",
+            text="Сварить",
+            cooking_time=10,
+            image="recipes/images/soup.png",
+        )
+        Favorite.objects.create(user=reader, recipe=recipe)
+        Follow.objects.create(user=reader, author=author)
+        author.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (author.recipes_count, author.followers_count), (1, 1)
+        )
+        self.assertEqual(recipe.favorites_count, 1)
+        reader.delete()
+        author.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        self.assertEqual(recipe.favorites_count, 0)
+        recipe.delete()
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 0)
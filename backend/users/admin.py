@@ -30,7 +30,14 @@ class NewUserAdmin(UserAdmin):
     search_fields = ("email", "username", "first_name", "last_name")
     list_filter = ("is_staff", "is_active")
     ordering = ("email",)
-    list_display = ("email", "first_name", "last_name", "username")
+    list_display = (
+        "email",
+        "first_name",
+        "last_name",
+        "username",
+        "recipes_count",
+        "followers_count",
+    )
     filter_horizontal = []
     fieldsets = (
         ("Основная информация", {"fields": ("email", "password")}),
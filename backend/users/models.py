@@ -33,9 +33,21 @@ class User(AbstractUser):
     avatar = models.ImageField(
         upload_to="users/avatars", blank=True, null=True, verbose_name="аватар"
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Размеры аватара",
+    )
     groups = None
     user_permissions = None
     is_admin = models.BooleanField(default=False, verbose_name="Админ")
+    recipes_count = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name="Рецептов"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name="Подписчиков"
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "last_name"]